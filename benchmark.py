@@ -0,0 +1,928 @@
+"""Benchmarks for the food ordering app.
+
+Run from the project root, e.g.:
+
+    python benchmark.py render --iterations 2000
+    python benchmark.py menu_cache
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmark.py cart
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmark.py cart_batch --menu-items 500
+    python benchmark.py checkout --clients 8 --iterations 50
+    SQLITE_JOURNAL_MODE=DELETE python benchmark.py concurrency --iterations 50
+    python benchmark.py intake --clients 16 --iterations 50
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmark.py orders_stream --orders 20000
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmark.py search --menu-items 50000 --iterations 500
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmark.py export --orders 100000
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmark.py menu_import --menu-items 5000
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmark.py analytics --orders 100000 --iterations 200
+    python benchmark.py startup --iterations 1000
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmark.py kitchen --orders 500
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmark.py workers --workers 8 --clients 16 --iterations 50
+
+End-to-end run over every route, seeded to a given size and saved for
+comparison with a later run (use a scratch DATABASE_URL, seeding adds rows):
+
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmark.py routes \
+        --users 500 --menu-items 2000 --orders 20000 --iterations 200 \
+        --output before.json
+    ... change something ...
+    DATABASE_URL=sqlite:////tmp/bench.db python benchmark.py routes \
+        --iterations 200 --compare before.json --server --clients 8
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import event, insert, update
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+from food_ordering import (create_app, db, init_db, cart_key, rebuild_order_stats,
+                           rebuild_menu_search, search_menu, export_orders, import_menu, read_menu_import,
+                           rebuild_sales_rollups, get_sales_report, write_orders,
+                           KitchenQueue, MemoryState, KITCHEN_STATUSES,
+                           Category, MenuItem, Order, OrderItem, User, ORDER_STATUSES,
+                           PAGE_TEMPLATE)
+
+app = create_app()
+cart_store = app.extensions['cart_store']
+menu_cache = app.extensions['menu_cache']
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    return {'iterations': iterations, 'total_s': round(elapsed, 4),
+            'per_call_us': round(elapsed / iterations * 1e6, 2)}
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 3)
+
+    return {'count': len(ordered), 'p50_ms': pick(0.50), 'p95_ms': pick(0.95),
+            'p99_ms': pick(0.99), 'max_ms': round(ordered[-1] * 1000, 3)}
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def __enter__(self):
+        with app.app_context():
+            self.engine = db.engine
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+    def _count(self, conn, cursor, statement, *args):
+        self.count += 1
+        self.statements.append(statement)
+
+    def reads(self, table):
+        return sum(1 for statement in self.statements
+                   if statement.lstrip().upper().startswith('SELECT') and f'FROM {table}' in statement)
+
+
+def ensure_user(username, password='bench123'):
+    with app.app_context():
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            user = User(username=username, email=f'{username}@bench.local',
+                        password=generate_password_hash(password))
+            db.session.add(user)
+            db.session.commit()
+        return user.id
+
+
+def login(client, username='admin', password='admin123'):
+    client.post('/login', data={'username': username, 'password': password})
+    with client.session_transaction() as sess:
+        return sess.get('user_id')
+
+
+def bench_client(n):
+    # One user per simulated client so concurrent carts never collide.
+    username = f'bench{n}'
+    ensure_user(username)
+    client = app.test_client()
+    return client, login(client, username, 'bench123')
+
+
+def bench_render(args):
+    context = {'title': 'Menu', 'user_nav': '', 'alerts': '',
+               'content': '<div class="menu-grid"></div>'}
+
+    # Before: every request handed a fresh template source to Jinja,
+    # which parsed and compiled it from scratch.
+    def compile_per_request():
+        app.jinja_env.from_string(PAGE_TEMPLATE).render(**context)
+
+    # After: the layout is compiled once and only rendered per request.
+    def precompiled():
+        app.extensions['page_layout'].render(**context)
+
+    with app.app_context():
+        results = {
+            'compile_per_request': timed(compile_per_request, args.iterations),
+            'precompiled': timed(precompiled, args.iterations),
+        }
+
+    init_db(app)
+    client = app.test_client()
+    login(client)
+    for path in ('/menu', '/orders'):
+        results[f'GET {path}'] = timed(lambda: client.get(path), args.iterations // 10 or 1)
+    return results
+
+
+def bench_menu_cache(args):
+    init_db(app)
+    client = app.test_client()
+    results = {}
+
+    menu_cache.invalidate()
+    with QueryCounter() as queries:
+        client.get('/menu')
+    results['cold_queries'] = queries.count
+
+    with QueryCounter() as queries:
+        results['warm GET /menu'] = timed(lambda: client.get('/menu'), args.iterations)
+    results['warm_queries'] = queries.count
+
+    def uncached():
+        menu_cache.invalidate()
+        client.get('/menu')
+
+    results['uncached GET /menu'] = timed(uncached, args.iterations)
+    results['cache'] = menu_cache.stats()
+    return results
+
+
+def bench_cart(args):
+    # The cart page and checkout price every line from one catalogue query,
+    # so their query counts do not grow with the number of cart lines.
+    init_db(app)
+    seed_dataset(args)
+    client, user_id = bench_client(0)
+    with app.app_context():
+        item_ids = [item.id for item in MenuItem.query.filter_by(is_available=True).limit(25)]
+    assert len(item_ids) == 25, 'seed at least 25 available menu items (--menu-items)'
+    checkout_form = {'name': 'Bench', 'phone': '1', 'address': 'Bench St'}
+
+    def checkout(lines):
+        cart_store.save(cart_key(user_id), {str(item_id): 2 for item_id in item_ids[:lines]})
+        with QueryCounter() as queries:
+            response = client.post('/checkout', data=checkout_form)
+        assert response.status_code == 302 and response.location.endswith('/orders'), response.location
+        assert queries.reads('menu_item') == 1, queries.statements
+        return queries.count
+
+    results = {'cart_lines': len(item_ids)}
+    cart_store.save(cart_key(user_id), {str(item_id): 2 for item_id in item_ids})
+    with QueryCounter() as queries:
+        client.get('/cart')
+    assert queries.reads('menu_item') == 1, queries.statements
+    results['cart_queries'] = queries.count
+
+    checkout(1)  # the first order also creates the pending stats row
+    results['checkout_queries_1_line'] = checkout(1)
+    results['checkout_queries_25_lines'] = checkout(25)
+    assert results['checkout_queries_1_line'] == results['checkout_queries_25_lines'], results
+    return results
+
+
+def bench_cart_batch(args):
+    # A kiosk user adding ten dishes, then changing one quantity on the cart
+    # page. Before: one POST per click, each followed by a full page reload.
+    # After: the clicks go to /api/cart as one batch and the page updates in place.
+    init_db(app)
+    seed_dataset(args)
+    client, user_id = bench_client(0)
+    with app.app_context():
+        item_ids = [item.id for item in MenuItem.query.filter_by(is_available=True).limit(10)]
+
+    def per_click():
+        cart_store.delete(cart_key(user_id))
+        for item_id in item_ids:
+            client.post('/add_to_cart', json={'item_id': item_id})
+            client.get('/menu')
+        client.post('/update_cart', json={'item_id': item_ids[0], 'quantity': 2})
+        client.get('/cart')
+
+    def batched():
+        cart_store.delete(cart_key(user_id))
+        client.post('/api/cart', json={'ops': [{'op': 'add', 'item_id': item_id} for item_id in item_ids]})
+        client.post('/api/cart', json={'ops': [{'op': 'add', 'item_id': item_ids[0], 'quantity': 1}]})
+
+    iterations = max(1, args.iterations // 10)
+    results = {}
+    for name, scenario in (('per_click_reload', per_click), ('batched', batched)):
+        with QueryCounter() as queries:
+            scenario()
+        results[name] = dict(timed(scenario, iterations), queries=queries.count)
+    return results
+
+
+def bench_checkout(args):
+    init_db(app)
+    with app.app_context():
+        cart = {str(item.id): 1 for item in MenuItem.query.limit(3)}
+    form = {'name': 'Bench', 'phone': '1', 'address': 'Bench St'}
+    errors = []
+    placed = []
+
+    def worker(client, user_id):
+        for _ in range(args.iterations):
+            cart_store.save(cart_key(user_id), cart)
+            try:
+                response = client.post('/checkout', data=form)
+                if response.headers.get('Location', '').endswith('/orders'):
+                    placed.append(1)
+                else:
+                    errors.append(response.status_code)
+            except Exception as exc:
+                errors.append(type(exc).__name__)
+
+    clients = [bench_client(n) for n in range(args.clients)]
+    threads = [threading.Thread(target=worker, args=client) for client in clients]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {'clients': args.clients, 'orders': len(placed), 'errors': len(errors),
+            'elapsed_s': round(elapsed, 4), 'orders_per_s': round(len(placed) / elapsed, 1)}
+
+
+def bench_concurrency(args):
+    # Readers hit /orders (never cached) while writers run checkouts. Compare
+    # SQLITE_JOURNAL_MODE=DELETE against the default WAL to see reader stalls.
+    init_db(app)
+    with app.app_context():
+        cart = {str(item.id): 1 for item in MenuItem.query.limit(3)}
+        journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+    form = {'name': 'Bench', 'phone': '1', 'address': 'Bench St'}
+    read_latencies = []
+    errors = []
+    writes = []
+    writers_done = threading.Event()
+
+    def writer(client, user_id):
+        for _ in range(args.iterations):
+            cart_store.save(cart_key(user_id), cart)
+            try:
+                client.post('/checkout', data=form)
+                writes.append(1)
+            except Exception as exc:
+                errors.append(type(exc).__name__)
+
+    def reader():
+        client = app.test_client()
+        login(client)
+        while not writers_done.is_set():
+            start = time.perf_counter()
+            try:
+                client.get('/orders')
+                read_latencies.append(time.perf_counter() - start)
+            except Exception as exc:
+                errors.append(type(exc).__name__)
+
+    writers = [threading.Thread(target=writer, args=bench_client(n)) for n in range(args.clients)]
+    readers = [threading.Thread(target=reader) for _ in range(args.readers)]
+    start = time.perf_counter()
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    writers_done.set()
+    for thread in readers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {'journal_mode': journal_mode, 'writers': args.clients, 'readers': args.readers,
+            'orders_per_s': round(len(writes) / elapsed, 1), 'errors': len(errors),
+            'read_latency': percentiles(read_latencies)}
+
+
+def bench_intake(args):
+    # Same checkout load, one commit per order vs. the group-commit writer.
+    results = {}
+    for mode in ('direct', 'batched'):
+        app.config['ORDER_INTAKE'] = mode
+        results[mode] = bench_checkout(args)
+    return results
+
+
+def bench_search(args):
+    # FTS5 lookups against a LIKE scan over the same columns.
+    init_db(app)
+    seed_dataset(args)
+    rng = random.Random(args.seed)
+    # Common prefixes match thousands of dishes; an item number matches one.
+    query_sets = {
+        'common': [f'{rng.choice(DISH_WORDS)[:rng.randint(3, 6)]} {rng.choice(DISH_KINDS)[:3]}'
+                   for _ in range(args.iterations)],
+        'rare': [f'{rng.choice(DISH_KINDS)} {rng.randrange(args.menu_items)}' for _ in range(args.iterations)],
+    }
+    results = {}
+    with app.app_context():
+        def like_scan(query):
+            terms = query.split()
+            return db.session.execute(
+                db.select(MenuItem.id).join(Category)
+                .where(MenuItem.is_available,
+                       *[db.or_(MenuItem.name.ilike(f'%{t}%'), MenuItem.description.ilike(f'%{t}%'),
+                                Category.name.ilike(f'%{t}%')) for t in terms])
+                .limit(20)
+            ).all()
+
+        for name, search in (('like_scan', like_scan), ('fts5', lambda query: search_menu(query, 20))):
+            for kind, queries in query_sets.items():
+                latencies = []
+                for query in queries:
+                    start = time.perf_counter()
+                    search(query)
+                    latencies.append(time.perf_counter() - start)
+                results[f'{name}_{kind}'] = percentiles(latencies)
+    return results
+
+
+def bench_export(args):
+    # Full order export in each format: rows per second and peak memory.
+    init_db(app)
+    dataset = seed_dataset(args)
+    results = {'orders': dataset['orders']}
+    with app.app_context():
+        for fmt in ('csv', 'ndjson'):
+            tracemalloc.start()
+            start = time.perf_counter()
+            size = lines = 0
+            for chunk in export_orders(fmt, None, None, None):
+                size += len(chunk)
+                lines += chunk.count('\n')
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            results[fmt] = {'lines': lines, 'bytes': size, 'total_s': round(elapsed, 3),
+                            'lines_per_s': round(lines / elapsed), 'peak_kib': round(peak / 1024, 1)}
+    return results
+
+
+def bench_menu_import(args):
+    # Reprice every seeded item: one ORM load and flush per item vs. the
+    # bulk import, both committing once.
+    init_db(app)
+    seed_dataset(args)
+    rng = random.Random(args.seed)
+    results = {}
+    with app.app_context():
+        names = [name for name, in db.session.execute(db.select(MenuItem.name).order_by(MenuItem.id))]
+        names = list(dict.fromkeys(names))
+
+        def reprice():
+            return {name: round(rng.uniform(2, 30), 2) for name in names}
+
+        prices = reprice()
+        with QueryCounter() as queries:
+            start = time.perf_counter()
+            for name, price in prices.items():
+                item = MenuItem.query.filter_by(name=name).first()
+                item.price = price
+                db.session.flush()
+            db.session.commit()
+        results['orm_per_item'] = {'items': len(prices), 'total_s': round(time.perf_counter() - start, 3),
+                                   'queries': queries.count}
+
+        prices = reprice()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['name', 'price'])
+        writer.writerows(prices.items())
+        with QueryCounter() as queries:
+            start = time.perf_counter()
+            report = import_menu(read_menu_import(buffer.getvalue(), 'csv'))
+        results['bulk_import'] = {'items': len(prices), 'total_s': round(time.perf_counter() - start, 3),
+                                  'queries': queries.count, 'report': report}
+    return results
+
+
+def bench_analytics(args):
+    # Last 30 days of top items and daily revenue: GROUP BY over the order
+    # tables vs. the same report read from the rollups.
+    init_db(app)
+    seed_dataset(args)
+    results = {}
+    with app.app_context():
+        since = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=29)
+        revenue = db.func.sum(OrderItem.price * OrderItem.quantity)
+
+        def ad_hoc():
+            db.session.execute(
+                db.select(db.func.date(Order.created_at), db.func.count(Order.id), db.func.sum(Order.total_amount))
+                .where(Order.created_at >= since).group_by(db.func.date(Order.created_at))
+            ).all()
+            for key in (MenuItem.id, MenuItem.category_id):
+                db.session.execute(
+                    db.select(key, db.func.sum(OrderItem.quantity), revenue)
+                    .select_from(Order)
+                    .join(OrderItem, OrderItem.order_id == Order.id)
+                    .join(MenuItem, MenuItem.id == OrderItem.menu_item_id)
+                    .where(Order.created_at >= since).group_by(key).order_by(revenue.desc()).limit(10)
+                ).all()
+
+        iterations = max(1, args.iterations // 10)
+        results['group_by'] = timed(ad_hoc, iterations)
+        results['rollups'] = timed(lambda: get_sales_report('day', 30), iterations)
+    return results
+
+
+def _drain_kitchen(queue):
+    fires = dishes = 0
+    while True:
+        batches = queue.next_work(1)
+        if not batches:
+            return {'fires': fires, 'dishes': dishes, 'dishes_per_fire': round(dishes / max(fires, 1), 2)}
+        batch = batches[0]
+        queue.start(batch['menu_item_id'], [o['order_id'] for o in batch['orders']])
+        fires += 1
+        dishes += batch['quantity']
+
+
+def bench_kitchen(args):
+    # A rush of orders placed together: how many times the kitchen has to
+    # fire a dish to start them all with batching vs. one order line at a
+    # time, and what the display costs with the heap in memory vs. reloaded.
+    init_db(app)
+    seed_dataset(args)
+    rng = random.Random(args.seed)
+    results = {}
+    with app.app_context():
+        # Start from an empty pass: earlier active orders are marked delivered.
+        db.session.execute(update(Order).where(Order.status.in_(KITCHEN_STATUSES)).values(status='delivered'))
+        rebuild_order_stats()
+        user_id = ensure_user('bench0')
+        items = MenuItem.query.filter_by(is_available=True).limit(20).all()
+        pending = []
+        for _ in range(args.orders):
+            lines = [{'menu_item_id': item.id, 'category_id': item.category_id, 'name': item.name,
+                      'prep_minutes': item.prep_minutes, 'price': item.price, 'quantity': rng.randint(1, 2)}
+                     for item in rng.sample(items, rng.randint(1, 4))]
+            pending.append({'user_id': user_id, 'lines': lines, 'total': sum(l['price'] * l['quantity'] for l in lines),
+                            'name': 'Bench', 'phone': '1', 'address': 'Bench St'})
+        for start in range(0, len(pending), 100):
+            write_orders(pending[start:start + 100])
+
+        queue = app.extensions['kitchen_queue']
+        queue.next_work(10)
+        results['active_lines'] = len(queue._lines)
+        results['next_work'] = timed(lambda: queue.next_work(10), args.iterations)
+
+        def reload():
+            queue._loaded = False
+            queue.next_work(10)
+
+        results['reload_and_next_work'] = timed(reload, max(1, args.iterations // 10))
+        results['batched'] = _drain_kitchen(queue)
+        single = KitchenQueue(MemoryState(), app.config['KITCHEN_TARGET_MINUTES'], 0, 1)
+        results['one_at_a_time'] = _drain_kitchen(single)
+    return results
+
+
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import food_ordering
+imported = time.perf_counter()
+app = food_ordering.create_app()
+created = time.perf_counter()
+if sys.argv[1] == 'init_db':
+    food_ordering.init_db(app)
+ready = time.perf_counter()
+app.test_client().get('/menu')
+served = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'create_app_ms': (created - imported) * 1000,
+                  'init_db_ms': (ready - created) * 1000, 'first_request_ms': (served - ready) * 1000}))
+"""
+
+
+def bench_startup(args):
+    # Worker boot in a fresh interpreter: the factory alone (what a WSGI
+    # worker does) vs. also running init_db before serving, as every start used to.
+    init_db(app)
+    iterations = max(1, args.iterations // 100)
+    results = {}
+    for mode in ('factory', 'init_db'):
+        runs = [json.loads(subprocess.run([sys.executable, '-c', STARTUP_SCRIPT, mode], check=True,
+                                          capture_output=True, text=True).stdout)
+                for _ in range(iterations)]
+        results[mode] = {key: round(statistics.median(run[key] for run in runs), 2) for key in runs[0]}
+    return results
+
+
+def bench_orders_stream(args):
+    # Admin order listing at growing page sizes: time to the first byte,
+    # total time and peak Python memory while the response is consumed.
+    init_db(app)
+    seed_dataset(args)
+    app.config['ORDERS_PAGE_MAX'] = max(app.config['ORDERS_PAGE_MAX'], args.orders)
+    client = app.test_client()
+    login(client)
+    results = {}
+    for per_page in sorted({10, 100, 1000, args.orders}):
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = client.get(f'/orders?per_page={per_page}', headers={'Accept-Encoding': 'gzip'},
+                              buffered=False)
+        chunks = iter(response.response)
+        size = len(next(chunks))
+        first_byte = time.perf_counter() - start
+        for chunk in chunks:
+            size += len(chunk)
+        total = time.perf_counter() - start
+        response.close()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[per_page] = {'first_byte_ms': round(first_byte * 1000, 2), 'total_ms': round(total * 1000, 2),
+                             'bytes': size, 'peak_kib': round(peak / 1024, 1)}
+    return results
+
+
+DISH_WORDS = ['spicy', 'smoked', 'grilled', 'crispy', 'garlic', 'cheesy', 'vegan', 'classic',
+              'tandoori', 'truffle', 'lemon', 'honey', 'pepper', 'herb', 'sweet', 'sour']
+DISH_KINDS = ['pizza', 'burger', 'wrap', 'salad', 'noodles', 'curry', 'taco', 'soup',
+              'sandwich', 'pasta', 'rice', 'cake', 'shake', 'tea', 'fries', 'kebab']
+
+
+def seed_dataset(args):
+    # Tops the database up to the requested sizes with bulk inserts.
+    rng = random.Random(args.seed)
+    with app.app_context():
+        have = Category.query.count()
+        if have < args.categories:
+            db.session.execute(insert(Category), [
+                {'name': f'Category {n}', 'description': 'Seeded for benchmarks'}
+                for n in range(have, args.categories)
+            ])
+        category_ids = [row.id for row in Category.query]
+
+        have = MenuItem.query.count()
+        if have < args.menu_items:
+            db.session.execute(insert(MenuItem), [
+                {'name': f'{rng.choice(DISH_WORDS)} {rng.choice(DISH_KINDS)} {n}',
+                 'description': f'{rng.choice(DISH_WORDS)} {rng.choice(DISH_WORDS)} seeded dish number {n}',
+                 'price': round(rng.uniform(2, 30), 2), 'category_id': rng.choice(category_ids),
+                 'is_available': rng.random() > 0.05}
+                for n in range(have, args.menu_items)
+            ])
+        menu_prices = {row.id: row.price for row in MenuItem.query}
+
+        have = User.query.count()
+        if have < args.users:
+            password = generate_password_hash('bench123')
+            db.session.execute(insert(User), [
+                {'username': f'seed{n}', 'email': f'seed{n}@bench.local', 'password': password}
+                for n in range(have, args.users)
+            ])
+        user_ids = [row.id for row in User.query]
+
+        have = Order.query.count()
+        now = datetime.utcnow()
+        menu_ids = list(menu_prices)
+        for chunk_start in range(have, args.orders, 1000):
+            orders = []
+            lines = []
+            for _ in range(chunk_start, min(chunk_start + 1000, args.orders)):
+                picked = rng.sample(menu_ids, min(len(menu_ids), rng.randint(1, 4)))
+                quantities = [rng.randint(1, 3) for _ in picked]
+                lines.append(list(zip(picked, quantities)))
+                orders.append({
+                    'user_id': rng.choice(user_ids),
+                    'total_amount': sum(menu_prices[i] * q for i, q in zip(picked, quantities)),
+                    'status': rng.choice(ORDER_STATUSES),
+                    'delivery_address': 'Bench St',
+                    'customer_name': 'Bench',
+                    'customer_phone': '1',
+                    'created_at': now - timedelta(seconds=rng.randint(0, 90 * 24 * 3600)),
+                })
+            order_ids = db.session.scalars(insert(Order).returning(Order.id, sort_by_parameter_order=True), orders).all()
+            db.session.execute(insert(OrderItem), [
+                {'order_id': order_id, 'menu_item_id': item_id, 'quantity': qty, 'price': menu_prices[item_id]}
+                for order_id, order_lines in zip(order_ids, lines)
+                for item_id, qty in order_lines
+            ])
+        db.session.commit()
+        # Bulk inserts skip the ORM hooks, so refresh what they would have kept.
+        rebuild_order_stats()
+        rebuild_sales_rollups()
+        rebuild_menu_search(db.session.connection())
+        db.session.commit()
+        menu_cache.invalidate()
+        return {'categories': len(category_ids), 'menu_items': len(menu_prices),
+                'users': len(user_ids), 'orders': max(have, args.orders)}
+
+
+_json_dumps = json.dumps  # HTTPClient.open() shadows the module with its json argument
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPClient:
+    """Enough of the Flask test client API to drive a real server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(), _NoRedirect())
+
+    def open(self, path, method='GET', data=None, json=None, buffered=True):
+        # The body is always read in full, as buffered=True does for the test client.
+        headers = {}
+        body = None
+        if json is not None:
+            body = _json_dumps(json).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                return SimpleNamespace(status_code=response.status)
+        except urllib.error.HTTPError as exc:
+            exc.read()
+            return SimpleNamespace(status_code=exc.code)
+
+    def post(self, path, **kwargs):
+        return self.open(path, method='POST', **kwargs)
+
+
+CHECKOUT_FORM = {'name': 'Bench', 'phone': '1', 'address': 'Bench St'}
+
+# (name, role, method, path, request kwargs, per-request setup)
+ROUTES = [
+    ('GET /', 'anon', 'GET', '/', {}, None),
+    ('GET /menu', 'anon', 'GET', '/menu', {}, None),
+    ('GET /menu?category_id', 'customer', 'GET', '/menu?category_id=1', {}, None),
+    ('GET /api/menu', 'anon', 'GET', '/api/menu', {}, None),
+    ('GET /login', 'anon', 'GET', '/login', {}, None),
+    ('POST /login', 'anon', 'POST', '/login', {'data': {'username': 'bench0', 'password': 'bench123'}}, None),
+    ('POST /add_to_cart', 'customer', 'POST', '/add_to_cart', {'json': {'item_id': 1}}, None),
+    ('GET /cart', 'customer', 'GET', '/cart', {}, 'fill_cart'),
+    ('POST /checkout', 'customer', 'POST', '/checkout', {'data': CHECKOUT_FORM}, 'fill_cart'),
+    ('GET /orders', 'customer', 'GET', '/orders', {}, None),
+    ('GET /orders (admin)', 'admin', 'GET', '/orders', {}, None),
+    ('GET /admin', 'admin', 'GET', '/admin', {}, None),
+]
+
+
+def bench_routes(args):
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    init_db(app)
+    dataset = seed_dataset(args)
+    with app.app_context():
+        sample_cart = {str(item.id): 1 for item in MenuItem.query.filter_by(is_available=True).limit(5)}
+
+    server = None
+    if args.server:
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        new_client = lambda: HTTPClient(f'http://127.0.0.1:{server.server_port}')
+    else:
+        new_client = app.test_client
+
+    # Every simulated client gets its own session per role.
+    sessions = []
+    for n in range(args.clients):
+        ensure_user(f'bench{n}')
+        customer, admin = new_client(), new_client()
+        customer.post('/login', data={'username': f'bench{n}', 'password': 'bench123'})
+        admin.post('/login', data={'username': 'admin', 'password': 'admin123'})
+        with app.app_context():
+            user_id = User.query.filter_by(username=f'bench{n}').one().id
+        sessions.append({'anon': new_client(), 'customer': customer, 'admin': admin, 'user_id': user_id})
+
+    routes = {}
+    for name, role, method, path, kwargs, setup in ROUTES:
+        latencies = []
+        errors = []
+
+        def worker(state):
+            client = state[role]
+            for _ in range(max(1, args.iterations // args.clients)):
+                if setup == 'fill_cart':
+                    cart_store.save(cart_key(state['user_id']), sample_cart)
+                start = time.perf_counter()
+                try:
+                    status = client.open(path, method=method, buffered=True, **kwargs).status_code
+                except Exception as exc:
+                    errors.append(type(exc).__name__)
+                    continue
+                latencies.append(time.perf_counter() - start)
+                if status >= 400:
+                    errors.append(status)
+
+        threads = [threading.Thread(target=worker, args=(state,)) for state in sessions]
+        with QueryCounter() as queries:
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        routes[name] = dict(
+            percentiles(latencies),
+            requests_per_s=round(len(latencies) / elapsed, 1),
+            queries_per_request=round(queries.count / max(1, len(latencies)), 2),
+            errors=len(errors),
+        )
+
+    if server:
+        server.shutdown()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+            'mode': 'server' if args.server else 'test_client',
+            'clients': args.clients,
+            'iterations': args.iterations,
+            'dataset': dataset,
+        },
+        'routes': routes,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['routes']
+        report['compare'] = {
+            name: {
+                'p50_ratio': round(stats['p50_ms'] / baseline[name]['p50_ms'], 3),
+                'requests_per_s_ratio': round(stats['requests_per_s'] / baseline[name]['requests_per_s'], 3),
+                'queries_delta': round(stats['queries_per_request'] - baseline[name]['queries_per_request'], 2),
+            }
+            for name, stats in routes.items()
+            if name in baseline and baseline[name].get('p50_ms') and stats.get('p50_ms')
+        }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+# Logged-in mix for the workers benchmark; /cart only answers 200 when the
+# session cookie and the cart written by another worker are both honoured.
+WORKER_REQUESTS = [
+    ('GET', '/', None),
+    ('GET', '/menu', None),
+    ('GET', '/menu?category_id=1', None),
+    ('GET', '/api/menu', None),
+    ('GET', '/menu/search?q=pizza', None),
+    ('POST', '/add_to_cart', {'item_id': 1}),
+    ('GET', '/cart', None),
+]
+
+
+def _serve_worker(sock, config):
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', sock.getsockname()[1], create_app(config), fd=sock.fileno())
+    server.serve_forever()
+
+
+def _drive_worker_pool(job):
+    port, n, iterations = job
+    client = HTTPClient(f'http://127.0.0.1:{port}')
+    client.post('/login', data={'username': f'bench{n}', 'password': 'bench123'})
+    latencies = []
+    errors = 0
+    for _ in range(iterations):
+        for method, path, body in WORKER_REQUESTS:
+            started = time.perf_counter()
+            status = client.open(path, method=method, json=body).status_code
+            latencies.append(time.perf_counter() - started)
+            errors += status != 200
+    return latencies, errors
+
+
+def bench_workers(args):
+    # Pre-forked worker processes accepting on one listening socket, as
+    # gunicorn runs them, sharing state through a SQLite file. Clients run in
+    # their own processes so the load generator's GIL isn't the bottleneck.
+    init_db(app)
+    seed_dataset(args)
+    for n in range(args.clients):
+        ensure_user(f'bench{n}')
+    config = {'SHARED_STATE': 'sqlite', 'CART_STORE': 'shared', 'PASSWORD_HASH_WORKERS': 0,
+              'SHARED_STATE_PATH': os.path.join(tempfile.mkdtemp(), 'shared_state.db')}
+    counts = sorted({1, args.workers} | {2 ** i for i in range(args.workers.bit_length()) if 2 ** i < args.workers})
+    context = multiprocessing.get_context('fork')
+    results = {'cpu_count': os.cpu_count(), 'clients': args.clients}
+    for workers in counts:
+        sock = socket.create_server(('127.0.0.1', 0), backlog=128)
+        pids = []
+        for _ in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    _serve_worker(sock, config)
+                finally:
+                    os._exit(0)
+            pids.append(pid)
+        try:
+            jobs = [(sock.getsockname()[1], n, args.iterations) for n in range(args.clients)]
+            with context.Pool(args.clients) as pool:
+                pool.map(_drive_worker_pool, [(port, n, 1) for port, n, _ in jobs])
+                started = time.perf_counter()
+                runs = pool.map(_drive_worker_pool, jobs)
+                elapsed = time.perf_counter() - started
+        finally:
+            for pid in pids:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            sock.close()
+        latencies = [latency for run, _ in runs for latency in run]
+        results[f'{workers}_workers'] = dict(
+            percentiles(latencies),
+            requests_per_s=round(len(latencies) / elapsed, 1),
+            errors=sum(errors for _, errors in runs),
+        )
+    baseline = results['1_workers']['requests_per_s']
+    for workers in counts:
+        entry = results[f'{workers}_workers']
+        entry['speedup'] = round(entry['requests_per_s'] / baseline, 2)
+    return results
+
+
+BENCHMARKS = {
+    'render': bench_render,
+    'menu_cache': bench_menu_cache,
+    'cart': bench_cart,
+    'cart_batch': bench_cart_batch,
+    'checkout': bench_checkout,
+    'concurrency': bench_concurrency,
+    'intake': bench_intake,
+    'routes': bench_routes,
+    'orders_stream': bench_orders_stream,
+    'search': bench_search,
+    'export': bench_export,
+    'menu_import': bench_menu_import,
+    'analytics': bench_analytics,
+    'startup': bench_startup,
+    'workers': bench_workers,
+    'kitchen': bench_kitchen,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--clients', type=int, default=4,
+                        help='concurrent clients for multi-threaded benchmarks')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='largest worker process count for the workers benchmark')
+    parser.add_argument('--readers', type=int, default=4,
+                        help='concurrent readers for the concurrency benchmark')
+    parser.add_argument('--users', type=int, default=100, help='seeded dataset size (routes)')
+    parser.add_argument('--menu-items', type=int, default=200, help='seeded dataset size (routes)')
+    parser.add_argument('--categories', type=int, default=8, help='seeded dataset size (routes)')
+    parser.add_argument('--orders', type=int, default=1000, help='seeded dataset size (routes)')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for the seeded dataset')
+    parser.add_argument('--server', action='store_true',
+                        help='drive a threaded WSGI server over HTTP instead of the test client')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    parser.add_argument('--compare', help='JSON report from an earlier run to compare against')
+    args = parser.parse_args()
+    print(json.dumps(BENCHMARKS[args.benchmark](args), indent=2))
+
+
+if __name__ == '__main__':
+    main()
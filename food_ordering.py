@@ -1,15 +1,119 @@
-from flask import Flask, render_template_string, request, redirect, url_for, session, jsonify
+from flask import (Blueprint, Flask, current_app, request, redirect, url_for, session, jsonify, g,
+                   has_request_context, stream_with_context)
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Engine, bindparam, event, insert, or_, text, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, object_session, selectinload
+from markupsafe import escape
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.local import LocalProxy
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import chain
+import click
+import csv
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import mimetypes
+import multiprocessing
 import os
+import queue
+import re
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlencode
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-123'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///restaurant.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def load_config():
+    # Read when an app is created, so importing this module touches nothing.
+    shared_state = os.environ.get('SHARED_STATE', 'memory')
+    menu_import_max_bytes = int(os.environ.get('MENU_IMPORT_MAX_BYTES', 16 * 1024 * 1024))
+    return {
+        'SECRET_KEY': os.environ.get('SECRET_KEY'),
+        'SQLALCHEMY_DATABASE_URI': os.environ.get('DATABASE_URL', 'sqlite:///restaurant.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SQLALCHEMY_ENGINE_OPTIONS': {
+            option: int(os.environ[env_var])
+            for option, env_var in (
+                ('pool_size', 'DB_POOL_SIZE'),
+                ('max_overflow', 'DB_MAX_OVERFLOW'),
+                ('pool_timeout', 'DB_POOL_TIMEOUT'),
+                ('pool_recycle', 'DB_POOL_RECYCLE'),
+            )
+            if env_var in os.environ
+        },
+        'SQLITE_JOURNAL_MODE': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'SQLITE_SYNCHRONOUS': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'SQLITE_BUSY_TIMEOUT_MS': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'SQLITE_MMAP_SIZE': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'MENU_CACHE_SIZE': 256,
+        'MENU_SEARCH_LIMIT': 20,
+        'MENU_SEARCH_MAX': 100,
+        'MENU_IMPORT_MAX_BYTES': menu_import_max_bytes,
+        # The menu import is the largest body any route accepts.
+        'MAX_CONTENT_LENGTH': menu_import_max_bytes,
+        'ORDERS_PAGE_SIZE': 20,
+        'ORDERS_PAGE_MAX': int(os.environ.get('ORDERS_PAGE_MAX', 100)),
+        'ORDERS_STREAM_CHUNK': 50,
+        'ORDERS_EXPORT_CHUNK': 1000,
+        'SHARED_STATE': shared_state,
+        'SHARED_STATE_PATH': os.environ.get('SHARED_STATE_PATH'),
+        'CART_STORE': os.environ.get('CART_STORE', 'shared' if shared_state == 'sqlite' else 'memory'),
+        'CART_DB_PATH': os.environ.get('CART_DB_PATH'),
+        'CART_TTL_SECONDS': int(os.environ.get('CART_TTL_SECONDS', 7 * 24 * 3600)),
+        'CART_MAX_CARTS': int(os.environ.get('CART_MAX_CARTS', 10000)),
+        'CART_MAX_LINES': int(os.environ.get('CART_MAX_LINES', 100)),
+        'CART_MAX_QUANTITY': int(os.environ.get('CART_MAX_QUANTITY', 99)),
+        'CART_MAX_OPS': 100,
+        'ORDER_EVENTS_BUFFER': 100,
+        'ORDER_EVENTS_KEEPALIVE': 15,
+        'ORDER_EVENTS_POLL_MS': int(os.environ.get('ORDER_EVENTS_POLL_MS', 250)),
+        'KITCHEN_TARGET_MINUTES': int(os.environ.get('KITCHEN_TARGET_MINUTES', 30)),
+        'KITCHEN_BATCH_WINDOW_MINUTES': int(os.environ.get('KITCHEN_BATCH_WINDOW_MINUTES', 5)),
+        'KITCHEN_BATCH_MAX': int(os.environ.get('KITCHEN_BATCH_MAX', 8)),
+        'KITCHEN_DISPLAY_LIMIT': 10,
+        'ORDER_INTAKE': os.environ.get('ORDER_INTAKE', 'direct'),
+        'ORDER_INTAKE_BATCH': int(os.environ.get('ORDER_INTAKE_BATCH', 50)),
+        'ORDER_INTAKE_WAIT_MS': int(os.environ.get('ORDER_INTAKE_WAIT_MS', 5)),
+        'ORDER_INTAKE_QUEUE': int(os.environ.get('ORDER_INTAKE_QUEUE', 1000)),
+        'ORDER_INTAKE_SUBMIT_TIMEOUT': 1,
+        'ORDER_INTAKE_RESULT_TIMEOUT': 30,
+        'SLOW_REQUEST_MS': int(os.environ.get('SLOW_REQUEST_MS', 0)),
+        'COMPRESS_MIN_SIZE': int(os.environ.get('COMPRESS_MIN_SIZE', 500)),
+        'COMPRESS_LEVEL': int(os.environ.get('COMPRESS_LEVEL', 6)),
+        'PASSWORD_HASH_METHOD': os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1'),
+        'PASSWORD_HASH_WORKERS': int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1))),
+        'PASSWORD_HASH_MAX_PENDING': int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 16)),
+        'PASSWORD_HASH_WAIT': float(os.environ.get('PASSWORD_HASH_WAIT', 0.25)),
+    }
+
+db = SQLAlchemy()
+bp = Blueprint('main', __name__, cli_group=None)
+
+def _service(name):
+    # Module-level handle on a per-app object built in create_app().
+    return LocalProxy(lambda: current_app.extensions[name])
 
-db = SQLAlchemy(app)
+def _tune_sqlite_connection(config, dbapi_connection, connection_record):
+    # WAL lets readers carry on while a checkout is writing; the busy
+    # timeout makes writers queue instead of failing with "database is locked".
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}")
+    cursor.execute(f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}")
+    cursor.execute(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+    cursor.execute(f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}")
+    cursor.close()
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -37,6 +141,12 @@ class MenuItem(db.Model):
     image_url = db.Column(db.String(255))
     is_available = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Estimated minutes from firing a dish to it being ready, for the kitchen queue.
+    prep_minutes = db.Column(db.Integer, nullable=False, default=10, server_default='10')
+    
+    __table_args__ = (
+        db.Index('ix_menu_item_available_category', 'is_available', 'category_id'),
+    )
 
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -48,6 +158,12 @@ class Order(db.Model):
     customer_phone = db.Column(db.String(15), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     order_items = db.relationship('OrderItem', backref='order', lazy=True)
+    
+    __table_args__ = (
+        db.Index('ix_order_user_created', 'user_id', 'created_at'),
+        db.Index('ix_order_status_created', 'status', 'created_at'),
+        db.Index('ix_order_created', 'created_at'),
+    )
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -55,59 +171,1058 @@ class OrderItem(db.Model):
     menu_item_id = db.Column(db.Integer, db.ForeignKey('menu_item.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Float, nullable=False)
+    started_at = db.Column(db.DateTime)
     menu_item = db.relationship('MenuItem', backref='order_items')
+    
+    __table_args__ = (
+        db.Index('ix_order_item_order', 'order_id'),
+    )
+
+class OrderStat(db.Model):
+    # Running order count and revenue per status, maintained alongside the
+    # order writes so the dashboard never has to scan the order table.
+    status = db.Column(db.String(20), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+class SalesRollup(db.Model):
+    # Pre-aggregated sales per hour and per day, for each menu item, each
+    # category and overall (dimension 'total', key 0). Kept up to date at
+    # checkout so reports never group over the order tables.
+    grain = db.Column(db.String(4), primary_key=True)
+    dimension = db.Column(db.String(8), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    key = db.Column(db.Integer, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    
+    # Stored in primary key order, so a report's range read never leaves the key.
+    __table_args__ = {'sqlite_with_rowid': False}
+
+class SchemaMigration(db.Model):
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+ORDER_STATUSES = ('pending', 'preparing', 'ready', 'delivered')
+
+class MemoryState:
+    """State shared by the threads of one process; other workers never see it."""
+
+    shared = False
+    LOG_SIZE = 1000
+
+    def __init__(self):
+        self._values = {}
+        self._log = deque(maxlen=self.LOG_SIZE)
+        self._log_id = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._values[key] = (value, time.time() + ttl if ttl else None)
+
+    def setdefault(self, key, value):
+        with self._lock:
+            return self._values.setdefault(key, (value, None))[0]
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._values.get(key, (0, None))[0]) + 1
+            self._values[key] = (str(value), None)
+            return value
+
+    def append(self, channel, value):
+        with self._lock:
+            self._log_id += 1
+            self._log.append((self._log_id, channel, value))
+
+    def position(self):
+        with self._lock:
+            return self._log_id
+
+    def read(self, channel, after_id):
+        with self._lock:
+            return [(entry_id, value) for entry_id, entry_channel, value in self._log
+                    if entry_id > after_id and entry_channel == channel]
+
+class SQLiteState:
+    """State in a SQLite file, shared by every worker process on the host.
+    
+    Holds string values with an optional expiry, plus an append-only log
+    that workers poll to pass events to each other.
+    """
+
+    shared = True
+    PURGE_EVERY = 500
+    LOG_RETENTION = 300
+
+    def __init__(self, path, busy_timeout):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._writes = 0
+        self._ready = False
+
+    def _connect(self):
+        # One connection per thread, opened on first use. A forked worker
+        # opens its own rather than sharing one it inherited.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            if not self._ready:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._ready:
+                with conn:
+                    conn.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                                 'expires_at REAL) WITHOUT ROWID')
+                    conn.execute('CREATE TABLE IF NOT EXISTS state_log (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                                 'channel TEXT NOT NULL, value TEXT NOT NULL, created_at REAL NOT NULL)')
+                    conn.execute('CREATE INDEX IF NOT EXISTS ix_state_log_channel ON state_log (channel, id)')
+                self._ready = True
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _wrote(self, conn):
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            now = time.time()
+            conn.execute('DELETE FROM state WHERE expires_at < ?', (now,))
+            conn.execute('DELETE FROM state_log WHERE created_at < ?', (now - self.LOG_RETENTION,))
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at >= ?)',
+            (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl=None):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO state (key, value, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at',
+                (key, value, time.time() + ttl if ttl else None))
+            self._wrote(conn)
+
+    def setdefault(self, key, value):
+        # Whichever worker gets here first decides the value for all of them.
+        with self._connect() as conn:
+            conn.execute('INSERT INTO state (key, value) VALUES (?, ?) ON CONFLICT(key) DO NOTHING', (key, value))
+            return conn.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()[0]
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM state WHERE key = ?', (key,))
+
+    def incr(self, key):
+        with self._connect() as conn:
+            return int(conn.execute(
+                "INSERT INTO state (key, value) VALUES (?, '1') "
+                'ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1 RETURNING value',
+                (key,)).fetchone()[0])
+
+    def append(self, channel, value):
+        with self._connect() as conn:
+            conn.execute('INSERT INTO state_log (channel, value, created_at) VALUES (?, ?, ?)',
+                         (channel, value, time.time()))
+            self._wrote(conn)
+
+    def position(self):
+        row = self._connect().execute('SELECT seq FROM sqlite_sequence WHERE name = ?', ('state_log',)).fetchone()
+        return row[0] if row else 0
+
+    def read(self, channel, after_id):
+        return self._connect().execute(
+            'SELECT id, value FROM state_log WHERE channel = ? AND id > ? ORDER BY id',
+            (channel, after_id)).fetchall()
+
+def make_shared_state(app):
+    if app.config['SHARED_STATE'] == 'sqlite':
+        path = app.config['SHARED_STATE_PATH'] or os.path.join(app.instance_path, 'shared_state.db')
+        return SQLiteState(path, app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000)
+    return MemoryState()
+
+class MenuCache:
+    """Bounded LRU of rendered menu fragments, dropped whenever the catalogue changes.
+    
+    Each worker keeps its own entries; a version counter in the shared state
+    tells every worker when another one has seen the catalogue change.
+    """
+
+    VERSION_KEY = 'menu_cache:version'
+
+    def __init__(self, state, max_entries=256):
+        self.state = state
+        self.max_entries = max_entries
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._seen = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        seen = self.state.get(self.VERSION_KEY)
+        with self._lock:
+            if seen != self._seen:
+                self._seen = seen
+                self.version += 1
+                self._entries.clear()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            version = self.version
+
+        html = render()
+
+        with self._lock:
+            # Skip the store if the catalogue changed while we were rendering.
+            if version == self.version:
+                self._entries[key] = html
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return html
+
+    def clear(self):
+        """Drop this worker's entries only."""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def invalidate(self):
+        """Drop the entries of every worker sharing the state."""
+        seen = str(self.state.incr(self.VERSION_KEY))
+        with self._lock:
+            self._seen = seen
+            self.version += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+menu_cache = _service('menu_cache')
+
+class MemoryCartStore:
+    """Carts held in this process: LRU-bounded, each expiring after ttl seconds idle."""
+
+    def __init__(self, ttl, max_carts):
+        self.ttl = ttl
+        self.max_carts = max_carts
+        self._carts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, cart_id):
+        with self._lock:
+            entry = self._carts.get(cart_id)
+            if entry is None:
+                return {}
+            expires_at, cart = entry
+            if expires_at < time.time():
+                del self._carts[cart_id]
+                return {}
+            return dict(cart)
+
+    def save(self, cart_id, cart):
+        with self._lock:
+            self._carts[cart_id] = (time.time() + self.ttl, dict(cart))
+            self._carts.move_to_end(cart_id)
+            while len(self._carts) > self.max_carts:
+                self._carts.popitem(last=False)
+
+    def delete(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+class SharedCartStore:
+    """Carts in the shared state, so every worker sees the same cart."""
+
+    def __init__(self, state, ttl):
+        self.state = state
+        self.ttl = ttl
+
+    def load(self, cart_id):
+        value = self.state.get(f'cart:{cart_id}')
+        return json.loads(value) if value else {}
+
+    def save(self, cart_id, cart):
+        self.state.set(f'cart:{cart_id}', json.dumps(cart, separators=(',', ':')), self.ttl)
+
+    def delete(self, cart_id):
+        self.state.delete(f'cart:{cart_id}')
+
+def make_cart_store(app, state):
+    ttl = app.config['CART_TTL_SECONDS']
+    if app.config['CART_STORE'] == 'shared':
+        return SharedCartStore(state, ttl)
+    if app.config['CART_STORE'] == 'sqlite':
+        # A SQLite file of their own, apart from any other shared state.
+        path = app.config['CART_DB_PATH'] or os.path.join(app.instance_path, 'carts.db')
+        return SharedCartStore(SQLiteState(path, app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000), ttl)
+    return MemoryCartStore(ttl, app.config['CART_MAX_CARTS'])
+
+cart_store = _service('cart_store')
+
+class OrderEventSubscriber:
+    def __init__(self, user_id, is_admin, buffer_size):
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.dropped = 0
+        self._events = deque(maxlen=buffer_size)
+        self._ready = threading.Condition()
+
+    def push(self, event_data):
+        with self._ready:
+            # A slow client loses its oldest events rather than growing without bound.
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event_data)
+            self._ready.notify()
+
+    def pop_all(self, timeout):
+        with self._ready:
+            if not self._events:
+                self._ready.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+class OrderEventHub:
+    """Pub/sub for order events; admins see every order, customers their own.
+    
+    Subscribers are the streams open on this worker. With shared state, each
+    event is also written to its log, and a poller thread passes on the
+    events other workers wrote.
+    """
+
+    CHANNEL = 'order_events'
+
+    def __init__(self, state, buffer_size=100, poll_interval=0.25):
+        self.state = state
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._poller = None
+
+    def subscribe(self, user_id, is_admin):
+        subscriber = OrderEventSubscriber(user_id, is_admin, self.buffer_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self.state.shared and (self._poller is None or not self._poller.is_alive()):
+                self._poller = threading.Thread(target=self._poll, args=(self.state.position(),),
+                                                name='order-events', daemon=True)
+                self._poller.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event_type, order_id, user_id, status, **extra):
+        event_data = dict(extra, type=event_type, order_id=order_id, status=status)
+        if self.state.shared:
+            # Live updates are best effort: the change itself is already committed.
+            try:
+                self.state.append(self.CHANNEL, json.dumps({'pid': os.getpid(), 'user_id': user_id, 'event': event_data}))
+            except sqlite3.Error:
+                current_app.logger.exception('Could not share order event %s for order %s', event_type, order_id)
+        self._deliver(user_id, event_data)
+
+    def _deliver(self, user_id, event_data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if subscriber.is_admin or subscriber.user_id == user_id:
+                subscriber.push(event_data)
+
+    def _poll(self, after_id):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                entries = self.state.read(self.CHANNEL, after_id)
+            except sqlite3.Error:
+                continue
+            for after_id, value in entries:
+                entry = json.loads(value)
+                # This worker's own events were delivered when they were published.
+                if entry['pid'] != os.getpid():
+                    self._deliver(entry['user_id'], entry['event'])
+
+order_events = _service('order_events')
+
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    """Runs the password KDF in worker processes so a login storm can't starve request threads."""
+
+    def __init__(self, method, workers, max_pending, wait):
+        self.method = method
+        self.workers = workers
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._prefix = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        # Workers only run werkzeug's KDF. Fork them (ideally before the server
+        # starts its threads): spawn would re-run the __main__ script in each one.
+        with self._lock:
+            if self._pool is None and self.workers:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=context)
+                for _ in range(self.workers):
+                    self._pool.submit(int)
+            return self._pool
+
+    def _run(self, fn, *args, **kwargs):
+        # Beyond max_pending callers we fail fast instead of queueing forever.
+        if not self._slots.acquire(timeout=self.wait):
+            raise PasswordHasherBusy()
+        try:
+            if self.workers == 0:
+                return fn(*args, **kwargs)
+            pool = self._pool or self.start()
+            try:
+                return pool.submit(fn, *args, **kwargs).result()
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM-killed): replace the pool and retry once.
+                self._restart(pool)
+                return self.start().submit(fn, *args, **kwargs).result()
+        finally:
+            self._slots.release()
+
+    def _restart(self, broken):
+        with self._lock:
+            if self._pool is broken:
+                self._pool = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, method=self.method)
+
+    def verify(self, stored_hash, password):
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        # werkzeug fills in defaults ('scrypt' is stored as 'scrypt:32768:8:1'),
+        # so compare against the prefix a fresh hash actually gets.
+        if self._prefix is None:
+            self._prefix = self.hash('').split('$', 1)[0]
+        return stored_hash.split('$', 1)[0] != self._prefix
+
+password_hasher = _service('password_hasher')
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, value):
+        with self._lock:
+            series = self._series.get(endpoint)
+            if series is None:
+                series = self._series[endpoint] = {'buckets': [0] * len(self.buckets), 'sum': 0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for endpoint, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f'{self.name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {series["count"]}')
+                lines.append(f'{self.name}_sum{{endpoint="{endpoint}"}} {series["sum"]}')
+                lines.append(f'{self.name}_count{{endpoint="{endpoint}"}} {series["count"]}')
+        return lines
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+def make_request_metrics():
+    return {
+        'wall': Histogram('http_request_duration_seconds', 'Wall time per request.', SECONDS_BUCKETS),
+        'render': Histogram('http_request_render_seconds', 'Page layout render time per request.', SECONDS_BUCKETS),
+        'sql_count': Histogram('http_request_sql_statements', 'SQL statements per request.', (0, 1, 2, 5, 10, 25, 50, 100)),
+        'sql_time': Histogram('http_request_sql_seconds', 'Time spent in SQL per request.', SECONDS_BUCKETS),
+        'size': Histogram('http_response_size_bytes', 'Response body size.', (512, 2048, 8192, 32768, 131072, 524288)),
+    }
+
+request_metrics = _service('request_metrics')
+
+def render_metrics():
+    lines = []
+    for histogram in request_metrics.values():
+        lines.extend(histogram.expose())
+    cache = menu_cache.stats()
+    lines += [
+        '# TYPE menu_cache_hits_total counter', f"menu_cache_hits_total {cache['hits']}",
+        '# TYPE menu_cache_misses_total counter', f"menu_cache_misses_total {cache['misses']}",
+        '# TYPE menu_cache_entries gauge', f"menu_cache_entries {cache['entries']}",
+    ]
+    return '\n'.join(lines) + '\n'
+
+@bp.before_app_request
+def _start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.render_time = 0
+    g.sql_count = 0
+    g.sql_time = 0
+    g.sql_log = [] if current_app.config['SLOW_REQUEST_MS'] else None
+
+# The start time lives on the statement's execution context, which is
+# dropped with it, so a statement that raises leaves nothing behind.
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _stop_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    # Background threads (e.g. the order intake writer) have no request to charge.
+    if has_request_context() and 'request_started' in g:
+        g.sql_count += 1
+        g.sql_time += elapsed
+        if g.sql_log is not None:
+            g.sql_log.append((elapsed, statement))
+
+@bp.after_app_request
+def _record_request_metrics(response):
+    if 'request_started' not in g:
+        return response
+    observe = partial(_observe_request, current_app._get_current_object(), request_metrics._get_current_object(),
+                      g._get_current_object(), (request.endpoint or 'unmatched').removeprefix(f'{bp.name}.'),
+                      request.method, request.full_path.rstrip('?'))
+    if response.is_streamed:
+        # A streamed body runs its queries and sends its bytes after this
+        # hook, so observe once the server has finished with it. Sizing it
+        # would mean buffering it, so only a declared length is counted.
+        response.call_on_close(lambda: observe(response.content_length))
+    else:
+        observe(response.calculate_content_length())
+    return response
+
+def _observe_request(app, metrics, stats, endpoint, method, path, size):
+    # Takes everything it needs up front: for streams it runs from the
+    # response's close, after the request context is gone.
+    elapsed = time.perf_counter() - stats.request_started
+    metrics['wall'].observe(endpoint, elapsed)
+    metrics['render'].observe(endpoint, stats.render_time)
+    metrics['sql_count'].observe(endpoint, stats.sql_count)
+    metrics['sql_time'].observe(endpoint, stats.sql_time)
+    if size is not None:
+        metrics['size'].observe(endpoint, size)
+    
+    slow_ms = app.config['SLOW_REQUEST_MS']
+    if slow_ms and elapsed * 1000 >= slow_ms:
+        statements = ''.join(f'\n  {took * 1000:.1f} ms: {" ".join(sql.split())}' for took, sql in stats.sql_log)
+        app.logger.warning('Slow request %s %s: %.1f ms, %d SQL statements (%.1f ms)%s',
+                           method, path, elapsed * 1000, stats.sql_count, stats.sql_time * 1000, statements)
+
+COMPRESSIBLE_MIMETYPES = {'text/html', 'text/plain', 'text/csv', 'application/json', 'application/x-ndjson'}
+
+def _gzip_stream(chunks, level):
+    # Flush after every chunk so a streamed page still reaches the client
+    # piece by piece rather than once the compressor's buffer fills.
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+@bp.after_app_request
+def _compress_response(response):
+    if (response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 304)
+            or request.method == 'HEAD' or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not request.accept_encodings.quality('gzip'):
+        return response
+    
+    level = current_app.config['COMPRESS_LEVEL']
+    if response.is_streamed:
+        response.response = _gzip_stream(response.response, level)
+    else:
+        body = response.get_data()
+        if len(body) < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(gzip.compress(body, compresslevel=level, mtime=0))
+    response.headers['Content-Encoding'] = 'gzip'
+    # The compressed bytes differ from the uncompressed ones, so a strong
+    # validator no longer applies; a weak one still matches If-None-Match.
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def _mark_catalogue_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info['catalogue_changed'] = True
+    # Also drop now, so readers in this process stop serving the old rows;
+    # other workers hear about it once the change commits.
+    menu_cache.clear()
+
+for _model in (MenuItem, Category):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _mark_catalogue_changed)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_menu_on_commit(session):
+    if session.info.pop('catalogue_changed', False):
+        menu_cache.invalidate()
+
+@event.listens_for(Session, 'after_rollback')
+def _reset_catalogue_flag(session):
+    session.info.pop('catalogue_changed', None)
+
+# Full-text index over available menu items, their descriptions and their
+# category names (SQLite FTS5). Rows are keyed by menu item id and kept in
+# step with the catalogue by the model events below, inside the same
+# transaction as the change. Other databases fall back to a LIKE search.
+MENU_SEARCH_INSERT = """
+INSERT INTO menu_search (rowid, name, description, category)
+SELECT menu_item.id, menu_item.name, coalesce(menu_item.description, ''), category.name
+FROM menu_item JOIN category ON category.id = menu_item.category_id
+WHERE menu_item.is_available AND {where}
+"""
+
+def create_menu_search_index(connection):
+    if connection.dialect.name != 'sqlite':
+        return
+    connection.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS menu_search USING fts5("
+        "name, description, category, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    # Name matches count most, then category, then description.
+    connection.exec_driver_sql("INSERT INTO menu_search (menu_search, rank) VALUES ('rank', 'bm25(10.0, 1.0, 4.0)')")
+    rebuild_menu_search(connection)
+
+def rebuild_menu_search(connection):
+    # For writes that skip the ORM events, e.g. bulk inserts.
+    if connection.dialect.name != 'sqlite':
+        return
+    connection.exec_driver_sql('DELETE FROM menu_search')
+    connection.exec_driver_sql(MENU_SEARCH_INSERT.format(where='1'))
+
+def reindex_menu_items(connection, item_ids):
+    # Also used directly by bulk writes, which skip the mapper events.
+    if connection.dialect.name != 'sqlite':
+        return
+    item_ids = list(item_ids)
+    delete = text('DELETE FROM menu_search WHERE rowid IN :ids').bindparams(bindparam('ids', expanding=True))
+    reinsert = text(MENU_SEARCH_INSERT.format(where='menu_item.id IN :ids')).bindparams(
+        bindparam('ids', expanding=True))
+    for i in range(0, len(item_ids), 500):
+        chunk = item_ids[i:i + 500]
+        connection.execute(delete, {'ids': chunk})
+        connection.execute(reinsert, {'ids': chunk})
+
+def _index_menu_item(mapper, connection, target):
+    reindex_menu_items(connection, [target.id])
+
+def _index_category(mapper, connection, target):
+    if connection.dialect.name != 'sqlite':
+        return
+    params = {'id': target.id}
+    connection.execute(text('DELETE FROM menu_search WHERE rowid IN '
+                            '(SELECT id FROM menu_item WHERE category_id = :id)'), params)
+    connection.execute(text(MENU_SEARCH_INSERT.format(where='menu_item.category_id = :id')), params)
 
-def init_db():
+@event.listens_for(db.metadata, 'after_create')
+def _create_menu_search(target, connection, tables=(), **kw):
+    # A plain db.create_all() gets the index along with the menu tables;
+    # existing databases get it from migration 2.
+    if any(table.name == 'menu_item' for table in tables):
+        create_menu_search_index(connection)
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(MenuItem, _event, _index_menu_item)
+event.listen(Category, 'after_update', _index_category)
+
+def build_search_match(query):
+    # Each word becomes a quoted prefix term, so user input can never be
+    # read as FTS5 syntax; all terms must match.
+    terms = re.findall(r'\w+', query.lower())[:8]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def search_menu(query, limit):
+    match = build_search_match(query)
+    if not match:
+        return []
+    if db.engine.dialect.name == 'sqlite':
+        return db.session.execute(text("""
+            SELECT menu_item.id, menu_item.name, menu_item.description, menu_item.price,
+                   menu_item.image_url, menu_search.category
+            FROM menu_search JOIN menu_item ON menu_item.id = menu_search.rowid
+            WHERE menu_search MATCH :match
+            ORDER BY rank
+            LIMIT :limit
+        """), {'match': match, 'limit': limit}).all()
+    
+    terms = re.findall(r'\w+', query.lower())[:8]
+    return db.session.execute(
+        db.select(MenuItem.id, MenuItem.name, MenuItem.description, MenuItem.price,
+                  MenuItem.image_url, Category.name.label('category'))
+        .join(Category)
+        .where(MenuItem.is_available,
+               *[or_(MenuItem.name.ilike(f'%{term}%'), MenuItem.description.ilike(f'%{term}%'),
+                     Category.name.ilike(f'%{term}%')) for term in terms])
+        .order_by(MenuItem.name)
+        .limit(limit)
+    ).all()
+
+@bp.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Rebuild the full-text menu search index from the menu tables."""
+    rebuild_menu_search(db.session.connection())
+    db.session.commit()
+    click.echo('Menu search index rebuilt.')
+
+def bump_order_stat(status, orders, revenue):
+    # Runs inside the caller's transaction; committed together with the order.
+    result = db.session.execute(
+        update(OrderStat)
+        .where(OrderStat.status == status)
+        .values(order_count=OrderStat.order_count + orders, revenue=OrderStat.revenue + revenue)
+    )
+    if result.rowcount == 0:
+        db.session.add(OrderStat(status=status, order_count=orders, revenue=revenue))
+
+def compute_order_stats():
+    rows = db.session.query(Order.status, db.func.count(Order.id), db.func.sum(Order.total_amount)).group_by(Order.status)
+    return {status: (count, revenue or 0) for status, count, revenue in rows}
+
+def rebuild_order_stats():
+    OrderStat.query.delete()
+    for status, (count, revenue) in compute_order_stats().items():
+        db.session.add(OrderStat(status=status, order_count=count, revenue=revenue))
+    db.session.commit()
+
+def get_order_stats():
+    stats = {'total_orders': 0, 'total_revenue': 0, 'by_status': {}}
+    for row in OrderStat.query.all():
+        stats['by_status'][row.status] = row.order_count
+        stats['total_orders'] += row.order_count
+        stats['total_revenue'] += row.revenue
+    return stats
+
+ROLLUP_GRAINS = ('hour', 'day')
+
+def add_order_to_rollups(rollups, created_at, lines):
+    # lines are (menu_item_id, category_id, quantity, revenue) for one order.
+    hour = created_at.replace(minute=0, second=0, microsecond=0)
+    buckets = (('hour', hour), ('day', hour.replace(hour=0)))
+    counted = set()
+    for menu_item_id, category_id, quantity, revenue in lines:
+        for grain, bucket in buckets:
+            for dimension, key in (('item', menu_item_id), ('category', category_id), ('total', 0)):
+                totals = rollups.setdefault((grain, dimension, bucket, key), [0, 0, 0])
+                totals[1] += quantity
+                totals[2] += revenue
+                counted.add((grain, dimension, bucket, key))
+    for rollup_key in counted:
+        rollups[rollup_key][0] += 1
+
+def upsert_rollups(rollups):
+    # Adds the totals onto the stored rows, inside the caller's transaction.
+    rows = [
+        {'grain': grain, 'dimension': dimension, 'bucket': bucket, 'key': key,
+         'order_count': order_count, 'quantity': quantity, 'revenue': revenue}
+        for (grain, dimension, bucket, key), (order_count, quantity, revenue) in rollups.items()
+    ]
+    if not rows:
+        return
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite if dialect == 'sqlite' else postgresql).insert(SalesRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['grain', 'dimension', 'bucket', 'key'],
+            set_={column: getattr(SalesRollup, column) + getattr(stmt.excluded, column)
+                  for column in ('order_count', 'quantity', 'revenue')},
+        )
+        db.session.execute(stmt, rows)
+        return
+    for row in rows:
+        result = db.session.execute(
+            update(SalesRollup)
+            .where(SalesRollup.grain == row['grain'], SalesRollup.dimension == row['dimension'],
+                   SalesRollup.bucket == row['bucket'], SalesRollup.key == row['key'])
+            .values(order_count=SalesRollup.order_count + row['order_count'],
+                    quantity=SalesRollup.quantity + row['quantity'],
+                    revenue=SalesRollup.revenue + row['revenue'])
+        )
+        if result.rowcount == 0:
+            db.session.add(SalesRollup(**row))
+
+def rebuild_sales_rollups():
+    # Clears the rollups and re-adds every order up to the newest one seen
+    # at that moment, all in one transaction so a failed rebuild leaves the
+    # old rollups in place. History is read in keyset chunks of
+    # ORDERS_EXPORT_CHUNK orders on the same connection.
+    chunk = current_app.config['ORDERS_EXPORT_CHUNK']
+    try:
+        SalesRollup.query.delete()
+        last_order_id = db.session.query(db.func.max(Order.id)).scalar() or 0
+        after = 0
+        orders = 0
+        while after < last_order_id:
+            created = dict(db.session.execute(
+                db.select(Order.id, Order.created_at)
+                .where(Order.id > after, Order.id <= last_order_id)
+                .order_by(Order.id)
+                .limit(chunk)
+            ).all())
+            if not created:
+                break
+            first, after = min(created), max(created)
+            lines = {}
+            for row in db.session.execute(
+                db.select(OrderItem.order_id, OrderItem.menu_item_id, MenuItem.category_id,
+                          OrderItem.quantity, OrderItem.price)
+                .join(MenuItem, MenuItem.id == OrderItem.menu_item_id)
+                .where(OrderItem.order_id.between(first, after))
+            ):
+                lines.setdefault(row.order_id, []).append(
+                    (row.menu_item_id, row.category_id, row.quantity, row.price * row.quantity))
+            rollups = {}
+            for order_id, order_lines in lines.items():
+                add_order_to_rollups(rollups, created[order_id], order_lines)
+            upsert_rollups(rollups)
+            orders += len(lines)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return orders
+
+def get_sales_report(grain, periods, top=10):
+    # Everything comes from the rollups: one range read per section.
+    step = timedelta(hours=1) if grain == 'hour' else timedelta(days=1)
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    if grain == 'day':
+        now = now.replace(hour=0)
+    since = now - step * (periods - 1)
+    
+    totals = {row.bucket: row for row in SalesRollup.query.filter(
+        SalesRollup.grain == grain, SalesRollup.dimension == 'total', SalesRollup.key == 0,
+        SalesRollup.bucket >= since)}
+    timeline = [(since + step * n, totals.get(since + step * n)) for n in range(periods)]
+    
+    def top_keys(dimension, model):
+        # Rank on the rollup rows alone and look up names for the winners only.
+        revenue = db.func.sum(SalesRollup.revenue).label('revenue')
+        ranked = (
+            db.select(SalesRollup.key, db.func.sum(SalesRollup.quantity).label('quantity'),
+                      db.func.sum(SalesRollup.order_count).label('order_count'), revenue)
+            .where(SalesRollup.grain == grain, SalesRollup.dimension == dimension, SalesRollup.bucket >= since)
+            .group_by(SalesRollup.key)
+            .order_by(revenue.desc())
+            .limit(top)
+            .subquery()
+        )
+        return db.session.execute(
+            db.select(model.name, ranked.c.quantity, ranked.c.order_count, ranked.c.revenue)
+            .join(model, model.id == ranked.c.key)
+            .order_by(ranked.c.revenue.desc())
+        ).all()
+    
+    return {'since': since, 'timeline': timeline,
+            'top_items': top_keys('item', MenuItem), 'top_categories': top_keys('category', Category)}
+
+@bp.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the hourly and daily sales rollups from the order history."""
+    orders = rebuild_sales_rollups()
+    click.echo(f'Sales rollups rebuilt from {orders} orders.')
+
+@bp.cli.command('rebuild-stats')
+@click.option('--verify', is_flag=True, help='Only compare the stored stats with a full recount.')
+def rebuild_stats_command(verify):
+    """Recompute the dashboard order stats from the order table."""
+    if not verify:
+        rebuild_order_stats()
+        click.echo('Order stats rebuilt.')
+        return
+    
+    stored = {row.status: (row.order_count, row.revenue) for row in OrderStat.query.all()}
+    actual = compute_order_stats()
+    mismatches = 0
+    for status in sorted(set(stored) | set(actual)):
+        have = stored.get(status, (0, 0))
+        want = actual.get(status, (0, 0))
+        if have[0] != want[0] or abs(have[1] - want[1]) > 0.005:
+            mismatches += 1
+            click.echo(f'{status}: stored {have[0]} orders / {have[1]:.2f}, actual {want[0]} orders / {want[1]:.2f}')
+    if mismatches:
+        raise click.ClickException(f'{mismatches} status row(s) out of date; run rebuild-stats.')
+    click.echo('Order stats match.')
+
+def _create_declared_indexes(connection):
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+def _add_kitchen_columns(connection):
+    # A database made by create_all() already has them.
+    inspector = db.inspect(connection)
+    for column in (MenuItem.__table__.c.prep_minutes, OrderItem.__table__.c.started_at):
+        if column.name in {c['name'] for c in inspector.get_columns(column.table.name)}:
+            continue
+        ddl = f'ALTER TABLE {column.table.name} ADD COLUMN {column.name} {column.type.compile(dialect=connection.dialect)}'
+        if column.server_default is not None:
+            ddl += f' NOT NULL DEFAULT {column.server_default.arg}'
+        connection.exec_driver_sql(ddl)
+
+# Applied in order, once each, to existing databases. create_all() only adds
+# missing tables, so changes to tables that already exist belong here.
+MIGRATIONS = [
+    (1, 'hot query indexes', _create_declared_indexes),
+    (2, 'menu full-text search', create_menu_search_index),
+    (3, 'kitchen prep times', _add_kitchen_columns),
+]
+
+def migrate_db():
+    db.create_all()
+    applied = {row.version for row in SchemaMigration.query.all()}
+    done = []
+    for version, name, migration in MIGRATIONS:
+        if version in applied:
+            continue
+        migration(db.session.connection())
+        db.session.add(SchemaMigration(version=version, name=name))
+        db.session.commit()
+        done.append(f'{version}: {name}')
+    return done
+
+@bp.cli.command('migrate')
+def migrate_command():
+    """Create the schema, or bring an existing database up to date."""
+    done = create_schema()
+    click.echo('\n'.join(f'Applied {name}' for name in done) or 'Schema up to date.')
+
+def create_schema():
+    done = migrate_db()
+    # Databases created before OrderStat or SalesRollup existed start with empty tables.
+    if OrderStat.query.first() is None and Order.query.first() is not None:
+        rebuild_order_stats()
+    if SalesRollup.query.first() is None and Order.query.first() is not None:
+        rebuild_sales_rollups()
+    return done
+
+def seed_db():
+    if Category.query.count() > 0:
+        return False
+    
+    categories = [
+        Category(name="Pizza", description="Delicious pizzas"),
+        Category(name="Burgers", description="Juicy burgers"),
+        Category(name="Drinks", description="Refreshing beverages"),
+        Category(name="Desserts", description="Sweet treats")
+    ]
+    
+    for category in categories:
+        db.session.add(category)
+    
+    menu_items = [
+        MenuItem(name="Margherita Pizza", description="Classic pizza with tomato and cheese", 
+                price=12.99, category_id=1, prep_minutes=15),
+        MenuItem(name="Pepperoni Pizza", description="Pizza with pepperoni", 
+                price=14.99, category_id=1, prep_minutes=15),
+        MenuItem(name="Cheeseburger", description="Beef patty with cheese", 
+                price=8.99, category_id=2, prep_minutes=10),
+        MenuItem(name="Chicken Burger", description="Grilled chicken burger", 
+                price=9.99, category_id=2, prep_minutes=12),
+        MenuItem(name="Coca Cola", description="500ml bottle", 
+                price=2.99, category_id=3, prep_minutes=1),
+        MenuItem(name="Chocolate Cake", description="Rich chocolate cake", 
+                price=5.99, category_id=4, prep_minutes=3)
+    ]
+    
+    for item in menu_items:
+        db.session.add(item)
+    
+    admin_user = User(
+        username="admin",
+        email="admin@restaurant.com",
+        password=generate_password_hash("admin123", method=current_app.config['PASSWORD_HASH_METHOD']),
+        phone="1234567890",
+        address="123 Restaurant St",
+        is_admin=True
+    )
+    db.session.add(admin_user)
+    
+    db.session.commit()
+    return True
+
+def init_db(app):
+    # Local development convenience; deployments run `flask migrate` and `flask seed`.
     with app.app_context():
-        db.create_all()
-        
-        if Category.query.count() == 0:
-            categories = [
-                Category(name="Pizza", description="Delicious pizzas"),
-                Category(name="Burgers", description="Juicy burgers"),
-                Category(name="Drinks", description="Refreshing beverages"),
-                Category(name="Desserts", description="Sweet treats")
-            ]
-            
-            for category in categories:
-                db.session.add(category)
-            
-            menu_items = [
-                MenuItem(name="Margherita Pizza", description="Classic pizza with tomato and cheese", 
-                        price=12.99, category_id=1),
-                MenuItem(name="Pepperoni Pizza", description="Pizza with pepperoni", 
-                        price=14.99, category_id=1),
-                MenuItem(name="Cheeseburger", description="Beef patty with cheese", 
-                        price=8.99, category_id=2),
-                MenuItem(name="Chicken Burger", description="Grilled chicken burger", 
-                        price=9.99, category_id=2),
-                MenuItem(name="Coca Cola", description="500ml bottle", 
-                        price=2.99, category_id=3),
-                MenuItem(name="Chocolate Cake", description="Rich chocolate cake", 
-                        price=5.99, category_id=4)
-            ]
-            
-            for item in menu_items:
-                db.session.add(item)
-            
-            admin_user = User(
-                username="admin",
-                email="admin@restaurant.com",
-                password=generate_password_hash("admin123"),
-                phone="1234567890",
-                address="123 Restaurant St",
-                is_admin=True
-            )
-            db.session.add(admin_user)
-            
-            db.session.commit()
+        create_schema()
+        seed_db()
+
+@bp.cli.command('seed')
+def seed_command():
+    """Add the starter menu and admin account to an empty database."""
+    if seed_db():
+        click.echo('Database seeded.')
+    else:
+        click.echo('Database already has a menu; nothing seeded.')
 
 def get_user_nav():
     if 'user_id' in session:
-        cart_count = len(session.get('cart', {}))
+        cart_count = session.get('cart_count', 0)
         admin_link = '<a href="/admin">Admin</a>' if session.get('is_admin') else ''
         return f'''
-        <a href="/cart">Cart ({cart_count})</a>
+        <a href="/cart" id="cart-link">Cart ({cart_count})</a>
         <a href="/orders">My Orders</a>
         {admin_link}
         <a href="/logout">Logout ({session.get("username", "User")})</a>
@@ -129,17 +1244,155 @@ def flash(message, category='success'):
         session['_flashes'] = []
     session['_flashes'].append((category, message))
 
-@app.route('/')
-def index():
-    featured_items = MenuItem.query.filter_by(is_available=True).limit(4).all()
+# The cart lives in cart_store keyed by user, so it follows the user across
+# devices and workers; the cookie only keeps the line count for the nav bar.
+def cart_key(user_id):
+    return f'user:{user_id}'
+
+def _is_cart_key(key):
+    return key.isascii() and key.isdigit() and _is_item_id(int(key))
+
+def get_cart():
+    # Carts stored before ids were validated may hold keys that are not menu
+    # item ids; leave them out so they can never reach a query.
+    return {key: qty for key, qty in cart_store.load(cart_key(session['user_id'])).items()
+            if _is_cart_key(key) and _is_int(qty)}
+
+def save_cart(cart):
+    cart_store.save(cart_key(session['user_id']), cart)
+    session['cart_count'] = len(cart)
+
+def clear_cart():
+    cart_store.delete(cart_key(session['user_id']))
+    session['cart_count'] = 0
+
+class StaticAssets:
+    # Serves the shared CSS/JS under content-hashed names so browsers can
+    # cache them forever; a changed file gets a new URL. The bytes and a
+    # gzip variant are built once, on the first page that links them.
+    def __init__(self, directory):
+        self.directory = directory
+        self.urls = {}
+        self.files = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+                    self._loaded = True
+
+    def load(self):
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                body = f.read()
+            digest = hashlib.sha256(body).hexdigest()[:12]
+            stem, ext = os.path.splitext(name)
+            hashed = f"{stem}.{digest}{ext}"
+            self.urls[name] = f"/assets/{hashed}"
+            self.files[hashed] = {
+                'body': body,
+                'gzip': gzip.compress(body, mtime=0),
+                'etag': digest,
+                'mimetype': mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            }
+
+    def url(self, name):
+        self._ensure_loaded()
+        return self.urls[name]
+
+    def get(self, hashed):
+        self._ensure_loaded()
+        return self.files.get(hashed)
+
+static_assets = _service('static_assets')
+
+@bp.app_template_global()
+def asset_url(name):
+    return static_assets.url(name)
+
+@bp.route('/assets/<filename>')
+def asset(filename):
+    entry = static_assets.get(filename)
+    if entry is None:
+        return 'Not found', 404
+    if request.accept_encodings.quality('gzip'):
+        response = current_app.response_class(entry['gzip'], mimetype=entry['mimetype'])
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(entry['etag'] + '-gz')
+    else:
+        response = current_app.response_class(entry['body'], mimetype=entry['mimetype'])
+        response.set_etag(entry['etag'])
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response.make_conditional(request)
+
+# One layout for every page, compiled once per app and reused per request.
+PAGE_TEMPLATE = '''
+<!DOCTYPE html>
+<html>
+<head>
+    <title>{{ title }}</title>
+    <link rel="stylesheet" href="{{ asset_url('app.css') }}">
+</head>
+<body>
+    <div class="header">
+        <h1>🍕 Food Ordering System</h1>
+    </div>
+    <div class="nav">
+        <a href="/">Home</a>
+        <a href="/menu">Menu</a>
+        {{ user_nav|safe }}
+    </div>
+    <div class="container">
+        {{ alerts|safe }}
+        {% block content %}{{ content|safe }}{% endblock %}
+    </div>
+    <script src="{{ asset_url('app.js') }}"></script>
+</body>
+</html>
+'''
+
+page_layout = _service('page_layout')
+
+def render_page(title, content):
+    started = time.perf_counter()
+    html = page_layout.render(
+        title=title,
+        user_nav=get_user_nav(),
+        alerts=get_alerts(),
+        content=content
+    )
+    g.render_time += time.perf_counter() - started
+    return html
+
+PAGE_CONTENT_MARKER = '<!--page-content-->'
+
+def render_page_stream(title, chunks):
+    # The layout (nav, flashed alerts) is rendered up front, while the
+    # session can still be saved; the content follows chunk by chunk.
+    head, tail = render_page(title, PAGE_CONTENT_MARKER).split(PAGE_CONTENT_MARKER)
+    
+    def generate():
+        yield head
+        yield from chunks
+        yield tail
     
-    featured_html = ""
-    for item in featured_items:
+    return current_app.response_class(stream_with_context(generate()), mimetype='text/html')
+
+def render_menu_items(items, logged_in):
+    html = ""
+    for item in items:
         order_btn = '<a href="/login" class="btn">Login to Order</a>'
-        if 'user_id' in session:
+        if logged_in:
             order_btn = f'<button class="btn" onclick="addToCart({item.id})">Add to Cart</button>'
         
-        featured_html += f'''
+        html += f'''
         <div class="menu-item">
             <h3>{item.name}</h3>
             <p>{item.description}</p>
@@ -147,6 +1400,38 @@ def index():
             {order_btn}
         </div>
         '''
+    return html
+
+def render_featured(logged_in):
+    featured_items = MenuItem.query.filter_by(is_available=True).limit(4).all()
+    return render_menu_items(featured_items, logged_in)
+
+SEARCH_FORM = '''
+    <form action="/menu/search" method="GET" class="form-group" style="display: flex; gap: 0.5rem;">
+        <input type="search" name="q" value="{query}" placeholder="Search the menu">
+        <button type="submit" class="btn">Search</button>
+    </form>
+'''
+
+def render_menu(category_id, logged_in):
+    if category_id:
+        items = MenuItem.query.filter_by(category_id=category_id, is_available=True).all()
+    else:
+        items = MenuItem.query.filter_by(is_available=True).all()
+    
+    categories = Category.query.all()
+    
+    cats_html = SEARCH_FORM.format(query='') + '<div style="margin-bottom: 1rem;"><a href="/menu" class="btn">All</a> '
+    for cat in categories:
+        cats_html += f'<a href="/menu?category_id={cat.id}" class="btn">{cat.name}</a> '
+    cats_html += '</div>'
+    
+    return cats_html + '<div class="menu-grid">' + render_menu_items(items, logged_in) + '</div>'
+
+@bp.route('/')
+def index():
+    logged_in = 'user_id' in session
+    featured_html = menu_cache.get_or_render(('featured', logged_in), lambda: render_featured(logged_in))
     
     content = f'''
     <div class="hero">
@@ -160,180 +1445,75 @@ def index():
     </div>
     '''
     
-    base_template = '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>%(title)s</title>
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { font-family: Arial, sans-serif; background: #f4f4f4; }
-            .header { background: #ff6b6b; color: white; padding: 1rem; text-align: center; }
-            .nav { background: #333; padding: 1rem; display: flex; gap: 1rem; flex-wrap: wrap; }
-            .nav a { color: white; text-decoration: none; padding: 0.5rem 1rem; border-radius: 4px; }
-            .nav a:hover { background: #555; }
-            .container { max-width: 1200px; margin: 0 auto; padding: 2rem; }
-            .menu-grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(280px, 1fr)); gap: 1.5rem; }
-            .menu-item { background: white; padding: 1rem; border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); }
-            .menu-item img { width: 100%%; height: 150px; object-fit: cover; border-radius: 5px; }
-            .price { color: #ff6b6b; font-size: 1.2rem; font-weight: bold; margin: 0.5rem 0; }
-            .btn { background: #ff6b6b; color: white; padding: 0.5rem 1rem; border: none; border-radius: 4px; cursor: pointer; text-decoration: none; display: inline-block; }
-            .btn:hover { background: #ff5252; }
-            .form-group { margin-bottom: 1rem; }
-            .form-group label { display: block; margin-bottom: 0.3rem; font-weight: bold; }
-            .form-group input, .form-group textarea { width: 100%%; padding: 0.5rem; border: 1px solid #ddd; border-radius: 4px; }
-            .alert { padding: 0.8rem; margin-bottom: 1rem; border-radius: 4px; }
-            .alert-success { background: #d4edda; color: #155724; }
-            .alert-error { background: #f8d7da; color: #721c24; }
-            .cart-item { display: flex; justify-content: space-between; align-items: center; padding: 0.8rem 0; border-bottom: 1px solid #eee; }
-            .order-card { background: white; padding: 1rem; border-radius: 6px; margin-bottom: 1rem; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }
-            .hero { text-align: center; padding: 2rem; background: linear-gradient(135deg, #667eea, #764ba2); color: white; border-radius: 8px; margin-bottom: 2rem; }
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>🍕 Food Ordering System</h1>
-        </div>
-        <div class="nav">
-            <a href="/">Home</a>
-            <a href="/menu">Menu</a>
-            %(user_nav)s
-        </div>
-        <div class="container">
-            %(alerts)s
-            %(content)s
-        </div>
-        <script>
-            setTimeout(function() { 
-                var alerts = document.querySelectorAll('.alert');
-                alerts.forEach(function(alert) { 
-                    alert.style.display = 'none';
-                });
-            }, 4000);
-            
-            %(scripts)s
-        </script>
-    </body>
-    </html>
-    '''
-    
-    scripts = '''
-    function addToCart(itemId) {
-        fetch('/add_to_cart', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({item_id: itemId})
-        }).then(function(r) { return r.json(); }).then(function(data) {
-            alert(data.message);
-            if(data.success) location.reload();
-        });
-    }
-    '''
-    
-    return render_template_string(base_template % {
-        'title': 'Home',
-        'user_nav': get_user_nav(),
-        'alerts': get_alerts(),
-        'content': content,
-        'scripts': scripts
-    })
+    return render_page('Home', content)
 
-@app.route('/menu')
+@bp.route('/menu')
 def menu():
-    category_id = request.args.get('category_id')
-    if category_id:
-        items = MenuItem.query.filter_by(category_id=category_id, is_available=True).all()
-    else:
-        items = MenuItem.query.filter_by(is_available=True).all()
+    # Key the cache on the parsed id, so '01' shares '1''s entry and junk
+    # values fall back to the full menu instead of adding entries.
+    category_id = request.args.get('category_id', type=int)
+    if not _is_item_id(category_id):
+        category_id = None
+    logged_in = 'user_id' in session
+    menu_html = menu_cache.get_or_render(
+        ('menu', category_id, logged_in), lambda: render_menu(category_id, logged_in))
     
-    categories = Category.query.all()
-    
-    cats_html = '<div style="margin-bottom: 1rem;"><a href="/menu" class="btn">All</a> '
-    for cat in categories:
-        cats_html += f'<a href="/menu?category_id={cat.id}" class="btn">{cat.name}</a> '
-    cats_html += '</div>'
-    
-    menu_html = cats_html + '<div class="menu-grid">'
-    for item in items:
-        order_btn = '<a href="/login" class="btn">Login to Order</a>'
-        if 'user_id' in session:
-            order_btn = f'<button class="btn" onclick="addToCart({item.id})">Add to Cart</button>'
-        
-        menu_html += f'''
-        <div class="menu-item">
-            <h3>{item.name}</h3>
-            <p>{item.description}</p>
-            <div class="price">${item.price:.2f}</div>
-            {order_btn}
-        </div>
-        '''
-    menu_html += '</div>'
-    
-    base_template = '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>%(title)s</title>
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { font-family: Arial, sans-serif; background: #f4f4f4; }
-            .header { background: #ff6b6b; color: white; padding: 1rem; text-align: center; }
-            .nav { background: #333; padding: 1rem; display: flex; gap: 1rem; flex-wrap: wrap; }
-            .nav a { color: white; text-decoration: none; padding: 0.5rem 1rem; border-radius: 4px; }
-            .nav a:hover { background: #555; }
-            .container { max-width: 1200px; margin: 0 auto; padding: 2rem; }
-            .menu-grid { display: grid; grid-template-columns: repeat(auto-fill, minmax(280px, 1fr)); gap: 1.5rem; }
-            .menu-item { background: white; padding: 1rem; border-radius: 8px; box-shadow: 0 2px 5px rgba(0,0,0,0.1); }
-            .price { color: #ff6b6b; font-size: 1.2rem; font-weight: bold; margin: 0.5rem 0; }
-            .btn { background: #ff6b6b; color: white; padding: 0.5rem 1rem; border: none; border-radius: 4px; cursor: pointer; text-decoration: none; display: inline-block; }
-            .btn:hover { background: #ff5252; }
-            .alert { padding: 0.8rem; margin-bottom: 1rem; border-radius: 4px; }
-            .alert-success { background: #d4edda; color: #155724; }
-            .alert-error { background: #f8d7da; color: #721c24; }
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>🍕 Food Ordering System</h1>
-        </div>
-        <div class="nav">
-            <a href="/">Home</a>
-            <a href="/menu">Menu</a>
-            %(user_nav)s
-        </div>
-        <div class="container">
-            %(alerts)s
-            %(content)s
-        </div>
-        <script>
-            %(scripts)s
-        </script>
-    </body>
-    </html>
-    '''
+    return render_page('Menu', menu_html)
+
+def build_menu_json():
+    items_by_category = {}
+    for item in MenuItem.query.filter_by(is_available=True).order_by(MenuItem.id):
+        items_by_category.setdefault(item.category_id, []).append({
+            'id': item.id,
+            'name': item.name,
+            'description': item.description,
+            'price': item.price,
+            'image_url': item.image_url
+        })
     
-    scripts = '''
-    function addToCart(itemId) {
-        fetch('/add_to_cart', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({item_id: itemId})
-        }).then(function(r) { return r.json(); }).then(function(data) {
-            alert(data.message);
-            if(data.success) location.reload();
-        });
-    }
-    '''
+    categories = [
+        {
+            'id': cat.id,
+            'name': cat.name,
+            'description': cat.description,
+            'items': items_by_category.get(cat.id, [])
+        }
+        for cat in Category.query.order_by(Category.id)
+    ]
+    body = json.dumps({'categories': categories}, separators=(',', ':'))
+    # Hash of the body, so every worker hands out the same tag for the same menu.
+    return body, hashlib.sha1(body.encode()).hexdigest()
+
+@bp.route('/api/menu')
+def api_menu():
+    # Built once per catalogue version; unchanged menus answer 304.
+    body, etag = menu_cache.get_or_render(('api',), build_menu_json)
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def get_search_limit():
+    limit = request.args.get('limit', type=int) or current_app.config['MENU_SEARCH_LIMIT']
+    return max(1, min(limit, current_app.config['MENU_SEARCH_MAX']))
+
+@bp.route('/menu/search')
+def menu_search():
+    query = request.args.get('q', '').strip()
+    results = search_menu(query, get_search_limit())
     
-    return render_template_string(base_template % {
-        'title': 'Menu',
-        'user_nav': get_user_nav(),
-        'alerts': get_alerts(),
-        'content': menu_html,
-        'scripts': scripts
-    })
+    items_html = render_menu_items(results, 'user_id' in session)
+    if query and not results:
+        items_html = f"<p>No dishes match \"{escape(query)}\".</p>"
+    content = SEARCH_FORM.format(query=escape(query)) + f'<div class="menu-grid">{items_html}</div>'
+    return render_page('Menu search', content)
+
+@bp.route('/api/menu/search')
+def api_menu_search():
+    results = search_menu(request.args.get('q', ''), get_search_limit())
+    return jsonify({'items': [dict(row._mapping) for row in results]})
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
@@ -344,10 +1524,16 @@ def register():
             flash('Username exists!', 'error')
             return redirect('/register')
         
+        try:
+            password_hash = password_hasher.hash(password)
+        except PasswordHasherBusy:
+            flash('We are very busy right now, please try again in a moment.', 'error')
+            return redirect('/register')
+        
         user = User(
             username=username,
             email=email,
-            password=generate_password_hash(password),
+            password=password_hash,
             phone=request.form.get('phone', ''),
             address=request.form.get('address', '')
         )
@@ -385,64 +1571,35 @@ def register():
     <p>Have an account? <a href="/login">Login</a></p>
     '''
     
-    base_template = '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>%(title)s</title>
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { font-family: Arial, sans-serif; background: #f4f4f4; }
-            .header { background: #ff6b6b; color: white; padding: 1rem; text-align: center; }
-            .nav { background: #333; padding: 1rem; display: flex; gap: 1rem; flex-wrap: wrap; }
-            .nav a { color: white; text-decoration: none; padding: 0.5rem 1rem; border-radius: 4px; }
-            .nav a:hover { background: #555; }
-            .container { max-width: 1200px; margin: 0 auto; padding: 2rem; }
-            .form-group { margin-bottom: 1rem; }
-            .form-group label { display: block; margin-bottom: 0.3rem; font-weight: bold; }
-            .form-group input, .form-group textarea { width: 100%%; padding: 0.5rem; border: 1px solid #ddd; border-radius: 4px; }
-            .btn { background: #ff6b6b; color: white; padding: 0.5rem 1rem; border: none; border-radius: 4px; cursor: pointer; text-decoration: none; display: inline-block; }
-            .btn:hover { background: #ff5252; }
-            .alert { padding: 0.8rem; margin-bottom: 1rem; border-radius: 4px; }
-            .alert-success { background: #d4edda; color: #155724; }
-            .alert-error { background: #f8d7da; color: #721c24; }
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>🍕 Food Ordering System</h1>
-        </div>
-        <div class="nav">
-            <a href="/">Home</a>
-            <a href="/menu">Menu</a>
-            %(user_nav)s
-        </div>
-        <div class="container">
-            %(alerts)s
-            %(content)s
-        </div>
-    </body>
-    </html>
-    '''
-    
-    return render_template_string(base_template % {
-        'title': 'Register',
-        'user_nav': get_user_nav(),
-        'alerts': get_alerts(),
-        'content': content
-    })
+    return render_page('Register', content)
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
         
         user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password, password):
-            session['user_id'] = user.id
-            session['username'] = user.username
-            session['is_admin'] = user.is_admin
+        if user:
+            user_id, stored_hash, is_admin = user.id, user.password, user.is_admin
+            # Don't hold a pooled connection while the hash runs.
+            db.session.rollback()
+        
+        try:
+            valid = bool(user) and password_hasher.verify(stored_hash, password)
+            if valid and password_hasher.needs_rehash(stored_hash):
+                # Old method or work factor: upgrade now that we know the password.
+                User.query.filter_by(id=user_id).update({'password': password_hasher.hash(password)})
+                db.session.commit()
+        except PasswordHasherBusy:
+            flash('Too many sign-ins right now, please try again in a moment.', 'error')
+            return redirect('/login')
+        
+        if valid:
+            session['user_id'] = user_id
+            session['username'] = username
+            session['is_admin'] = is_admin
+            session['cart_count'] = len(get_cart())
             flash('Login successful!', 'success')
             return redirect('/')
         else:
@@ -464,108 +1621,73 @@ def login():
     <p>No account? <a href="/register">Register</a></p>
     '''
     
-    base_template = '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>%(title)s</title>
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { font-family: Arial, sans-serif; background: #f4f4f4; }
-            .header { background: #ff6b6b; color: white; padding: 1rem; text-align: center; }
-            .nav { background: #333; padding: 1rem; display: flex; gap: 1rem; flex-wrap: wrap; }
-            .nav a { color: white; text-decoration: none; padding: 0.5rem 1rem; border-radius: 4px; }
-            .nav a:hover { background: #555; }
-            .container { max-width: 1200px; margin: 0 auto; padding: 2rem; }
-            .form-group { margin-bottom: 1rem; }
-            .form-group label { display: block; margin-bottom: 0.3rem; font-weight: bold; }
-            .form-group input { width: 100%%; padding: 0.5rem; border: 1px solid #ddd; border-radius: 4px; }
-            .btn { background: #ff6b6b; color: white; padding: 0.5rem 1rem; border: none; border-radius: 4px; cursor: pointer; }
-            .alert { padding: 0.8rem; margin-bottom: 1rem; border-radius: 4px; }
-            .alert-success { background: #d4edda; color: #155724; }
-            .alert-error { background: #f8d7da; color: #721c24; }
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>🍕 Food Ordering System</h1>
-        </div>
-        <div class="nav">
-            <a href="/">Home</a>
-            <a href="/menu">Menu</a>
-            %(user_nav)s
-        </div>
-        <div class="container">
-            %(alerts)s
-            %(content)s
-        </div>
-    </body>
-    </html>
-    '''
-    
-    return render_template_string(base_template % {
-        'title': 'Login',
-        'user_nav': get_user_nav(),
-        'alerts': get_alerts(),
-        'content': content
-    })
+    return render_page('Login', content)
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
     flash('Logged out!', 'success')
     return redirect('/')
 
-@app.route('/add_to_cart', methods=['POST'])
+@bp.route('/add_to_cart', methods=['POST'])
 def add_to_cart():
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Please login!'})
     
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
+    if not _is_item_id(data.get('item_id')):
+        return jsonify({'success': False, 'message': 'item_id must be a menu item id.'}), 400
     item_id = str(data['item_id'])
     
-    if 'cart' not in session:
-        session['cart'] = {}
-    
-    cart = session['cart']
+    cart = get_cart()
+    if item_id not in cart and len(cart) >= current_app.config['CART_MAX_LINES']:
+        return jsonify({'success': False, 'message': 'Cart is full!'})
     cart[item_id] = cart.get(item_id, 0) + 1
-    session['cart'] = cart
+    save_cart(cart)
     
     return jsonify({'success': True, 'message': 'Added to cart!'})
 
-@app.route('/cart')
-def cart():
-    if 'user_id' not in session:
-        flash('Please login!', 'error')
-        return redirect('/login')
+def load_menu_items(ids):
+    return {item.id: item for item in MenuItem.query.filter(MenuItem.id.in_(ids))} if ids else {}
+
+def price_cart(cart, catalogue=None):
+    if catalogue is None:
+        catalogue = load_menu_items([int(item_id) for item_id in cart])
     
-    cart = session.get('cart', {})
-    items = []
+    lines = []
     total = 0
-    
     for item_id, qty in cart.items():
-        item = MenuItem.query.get(int(item_id))
+        item = catalogue.get(int(item_id))
         if item:
             item_total = item.price * qty
             total += item_total
-            items.append({
+            # Plain values survive the session expiring the ORM rows on commit.
+            lines.append({
                 'item': item,
+                'menu_item_id': item.id,
+                'category_id': item.category_id,
+                'name': item.name,
+                'prep_minutes': item.prep_minutes,
+                'price': item.price,
                 'quantity': qty,
                 'total': item_total
             })
-    
+    return lines, total
+
+def render_cart_contents(items, total):
+    # The part of the cart page that /api/cart sends back to update in place.
     items_html = ""
     for cart_item in items:
         items_html += f'''
         <div class="cart-item">
             <div>
-                <h4>{cart_item['item'].name}</h4>
-                <p>${cart_item['item'].price} x {cart_item['quantity']}</p>
+                <h4>{cart_item['name']}</h4>
+                <p>${cart_item['price']} x {cart_item['quantity']}</p>
             </div>
             <div>
-                <button onclick="updateCart({cart_item['item'].id}, {cart_item['quantity'] - 1})">-</button>
+                <button onclick="changeCart({cart_item['menu_item_id']}, -1)">-</button>
                 <span>{cart_item['quantity']}</span>
-                <button onclick="updateCart({cart_item['item'].id}, {cart_item['quantity'] + 1})">+</button>
+                <button onclick="changeCart({cart_item['menu_item_id']}, 1)">+</button>
             </div>
             <div>${cart_item['total']:.2f}</div>
         </div>
@@ -582,134 +1704,448 @@ def cart():
     else:
         items_html = "<p>Cart is empty!</p>"
     
-    content = f'''
-    <h2>Your Cart</h2>
+    return f'''
     <div class="cart-items">
         {items_html}
     </div>
     {summary}
     '''
+
+@bp.route('/cart')
+def cart():
+    if 'user_id' not in session:
+        flash('Please login!', 'error')
+        return redirect('/login')
     
-    base_template = '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>%(title)s</title>
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { font-family: Arial, sans-serif; background: #f4f4f4; }
-            .header { background: #ff6b6b; color: white; padding: 1rem; text-align: center; }
-            .nav { background: #333; padding: 1rem; display: flex; gap: 1rem; flex-wrap: wrap; }
-            .nav a { color: white; text-decoration: none; padding: 0.5rem 1rem; border-radius: 4px; }
-            .nav a:hover { background: #555; }
-            .container { max-width: 1200px; margin: 0 auto; padding: 2rem; }
-            .cart-item { display: flex; justify-content: space-between; align-items: center; padding: 0.8rem 0; border-bottom: 1px solid #eee; }
-            .btn { background: #ff6b6b; color: white; padding: 0.5rem 1rem; border: none; border-radius: 4px; cursor: pointer; text-decoration: none; display: inline-block; }
-            .btn:hover { background: #ff5252; }
-            .alert { padding: 0.8rem; margin-bottom: 1rem; border-radius: 4px; }
-            .alert-success { background: #d4edda; color: #155724; }
-            .alert-error { background: #f8d7da; color: #721c24; }
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>🍕 Food Ordering System</h1>
-        </div>
-        <div class="nav">
-            <a href="/">Home</a>
-            <a href="/menu">Menu</a>
-            %(user_nav)s
-        </div>
-        <div class="container">
-            %(alerts)s
-            %(content)s
-        </div>
-        <script>
-            %(scripts)s
-        </script>
-    </body>
-    </html>
-    '''
+    cart = get_cart()
+    session['cart_count'] = len(cart)
+    items, total = price_cart(cart)
     
-    scripts = '''
-    function updateCart(itemId, newQty) {
-        fetch('/update_cart', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({item_id: itemId, quantity: newQty})
-        }).then(function(r) { return r.json(); }).then(function(data) {
-            if(data.success) location.reload();
-        });
-    }
+    content = f'''
+    <h2>Your Cart</h2>
+    <div id="cart">{render_cart_contents(items, total)}</div>
     '''
     
-    return render_template_string(base_template % {
-        'title': 'Cart',
-        'user_nav': get_user_nav(),
-        'alerts': get_alerts(),
-        'content': content,
-        'scripts': scripts
-    })
+    return render_page('Cart', content)
 
-@app.route('/update_cart', methods=['POST'])
+@bp.route('/update_cart', methods=['POST'])
 def update_cart():
-    data = request.get_json()
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Please login!'})
+    
+    data = request.get_json(silent=True) or {}
+    if not _is_item_id(data.get('item_id')) or not _is_int(data.get('quantity')):
+        return jsonify({'success': False, 'message': 'Send a menu item id and a whole quantity.'}), 400
     item_id = str(data['item_id'])
     quantity = data['quantity']
     
-    cart = session.get('cart', {})
+    cart = get_cart()
     if quantity <= 0:
         cart.pop(item_id, None)
+    elif item_id not in cart and len(cart) >= current_app.config['CART_MAX_LINES']:
+        return jsonify({'success': False, 'message': 'Cart is full!'})
     else:
         cart[item_id] = quantity
-    session['cart'] = cart
+    save_cart(cart)
     
     return jsonify({'success': True})
 
-@app.route('/checkout', methods=['GET', 'POST'])
+CART_OPS = ('add', 'set', 'remove')
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _is_item_id(value):
+    # Row ids are positive and fit in a signed 64-bit integer.
+    return _is_int(value) and 0 < value < 2 ** 63
+
+def apply_cart_ops(cart, ops, catalogue):
+    # Applies every op to a copy, so one bad op leaves the stored cart as it
+    # was. add changes a quantity by a (possibly negative) amount, set
+    # replaces it and remove drops the line; a quantity of 0 drops it too.
+    max_quantity = current_app.config['CART_MAX_QUANTITY']
+    cart = dict(cart)
+    for n, op in enumerate(ops, 1):
+        if not isinstance(op, dict) or op.get('op') not in CART_OPS:
+            raise ValueError(f"Operation {n}: op must be add, set or remove.")
+        if not _is_item_id(op.get('item_id')):
+            raise ValueError(f"Operation {n}: item_id must be a menu item id.")
+        item_id = str(op['item_id'])
+        if op['op'] == 'remove':
+            cart.pop(item_id, None)
+            continue
+        
+        quantity = op.get('quantity', 1)
+        if not _is_int(quantity) or not -max_quantity <= quantity <= max_quantity or (op['op'] == 'set' and quantity < 0):
+            raise ValueError(f"Operation {n}: quantity must be a whole number up to {max_quantity}.")
+        if op['op'] == 'add':
+            quantity = min(cart.get(item_id, 0) + quantity, max_quantity)
+        if quantity <= 0:
+            cart.pop(item_id, None)
+            continue
+        item = catalogue.get(op['item_id'])
+        if item is None or not item.is_available:
+            raise ValueError(f"Operation {n}: item {op['item_id']} is not on the menu.")
+        if item_id not in cart and len(cart) >= current_app.config['CART_MAX_LINES']:
+            raise ValueError('Cart is full!')
+        cart[item_id] = quantity
+    return cart
+
+@bp.route('/api/cart', methods=['POST'])
+def api_cart():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Please login!'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    ops = data.get('ops')
+    if not isinstance(ops, list) or not ops or len(ops) > current_app.config['CART_MAX_OPS']:
+        return jsonify({'success': False,
+                        'message': f"Send ops: a list of 1 to {current_app.config['CART_MAX_OPS']} operations."}), 400
+    
+    cart = get_cart()
+    # One lookup covers validating the ops and pricing the result.
+    ids = {int(item_id) for item_id in cart}
+    ids.update(op['item_id'] for op in ops if isinstance(op, dict) and _is_item_id(op.get('item_id')))
+    catalogue = load_menu_items(ids)
+    try:
+        cart = apply_cart_ops(cart, ops, catalogue)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    save_cart(cart)
+    
+    items, total = price_cart(cart, catalogue)
+    return jsonify({
+        'success': True,
+        'count': len(cart),
+        'lines': [{key: line[key] for key in ('menu_item_id', 'name', 'price', 'quantity', 'total')} for line in items],
+        'total': round(total, 2),
+        'html': render_cart_contents(items, total),
+    })
+
+# Orders the kitchen still has dishes to start for.
+KITCHEN_STATUSES = ('pending', 'preparing')
+
+class KitchenQueue:
+    """Order lines not yet started, most urgent first, for the kitchen display.
+    
+    A line must start by the time its order is due (KITCHEN_TARGET_MINUTES
+    after it was placed) less the dish's prep time, so slow dishes go ahead
+    of quick ones. The same dish due within the batch window on other orders
+    is fired with it. Each worker keeps its own heap, loaded from the order
+    tables on first use and again whenever another worker changes the queue.
+    """
+
+    VERSION_KEY = 'kitchen:version'
+
+    def __init__(self, state, target_minutes, batch_window_minutes, batch_max):
+        self.state = state
+        self.target = timedelta(minutes=target_minutes)
+        self.batch_window = timedelta(minutes=batch_window_minutes)
+        self.batch_max = batch_max
+        self._heap = []
+        self._lines = {}
+        self._by_item = {}
+        self._loaded = False
+        self._seen = None
+        self._lock = threading.Lock()
+
+    def _push(self, order_id, created_at, menu_item_id, name, quantity, prep_minutes):
+        start_by = created_at + self.target - timedelta(minutes=prep_minutes)
+        self._lines[(order_id, menu_item_id)] = {
+            'order_id': order_id, 'menu_item_id': menu_item_id, 'name': name,
+            'quantity': quantity, 'prep_minutes': prep_minutes, 'start_by': start_by,
+        }
+        self._by_item.setdefault(menu_item_id, set()).add(order_id)
+        heapq.heappush(self._heap, (start_by, order_id, menu_item_id))
+
+    def _drop(self, order_id, menu_item_id):
+        if self._lines.pop((order_id, menu_item_id), None) is not None:
+            orders = self._by_item[menu_item_id]
+            orders.discard(order_id)
+            if not orders:
+                del self._by_item[menu_item_id]
+
+    def _sync(self):
+        seen = self.state.get(self.VERSION_KEY)
+        if self._loaded and seen == self._seen:
+            return
+        rows = db.session.execute(
+            db.select(OrderItem.order_id, Order.created_at, OrderItem.menu_item_id, MenuItem.name,
+                      OrderItem.quantity, MenuItem.prep_minutes)
+            .join(Order, Order.id == OrderItem.order_id)
+            .join(MenuItem, MenuItem.id == OrderItem.menu_item_id)
+            .where(Order.status.in_(KITCHEN_STATUSES), OrderItem.started_at.is_(None))
+        ).all()
+        self._heap, self._lines, self._by_item = [], {}, {}
+        for row in rows:
+            self._push(*row)
+        self._loaded = True
+        self._seen = seen
+
+    def _changed(self):
+        # Tell the other workers to reload. If one of them changed the queue
+        # too since we last looked, reload ourselves as well. Best effort like
+        # order events: the change itself is already committed.
+        try:
+            version = self.state.incr(self.VERSION_KEY)
+        except sqlite3.Error:
+            current_app.logger.exception('Could not share a kitchen queue change')
+            self._loaded = False
+            return
+        if self._loaded and version == int(self._seen or 0) + 1:
+            self._seen = str(version)
+
+    def add_order(self, order_id, created_at, lines):
+        with self._lock:
+            if self._loaded:
+                for line in lines:
+                    self._push(order_id, created_at, line['menu_item_id'], line['name'],
+                               line['quantity'], line['prep_minutes'])
+            self._changed()
+
+    def status_changed(self, order_id, old_status, new_status):
+        if (old_status in KITCHEN_STATUSES) == (new_status in KITCHEN_STATUSES):
+            return
+        with self._lock:
+            if new_status in KITCHEN_STATUSES:
+                # Reopened: its lines have to be read back from the database.
+                self._loaded = False
+            else:
+                for key in [key for key in self._lines if key[0] == order_id]:
+                    self._drop(*key)
+            self._changed()
+
+    def start(self, menu_item_id, order_ids):
+        with self._lock:
+            for order_id in order_ids:
+                self._drop(order_id, menu_item_id)
+            self._changed()
+
+    def next_work(self, limit):
+        """The next batches to fire: one per dish, most urgent first."""
+        with self._lock:
+            self._sync()
+            # Started and finished lines are left in the heap and skipped;
+            # rebuild it once they outnumber the live ones.
+            if len(self._heap) > 2 * len(self._lines) + 64:
+                self._heap = [(line['start_by'], line['order_id'], line['menu_item_id'])
+                              for line in self._lines.values()]
+                heapq.heapify(self._heap)
+            candidates = list(self._heap)
+            batches = []
+            fired = set()
+            while candidates and len(batches) < limit:
+                start_by, order_id, menu_item_id = heapq.heappop(candidates)
+                if menu_item_id in fired or (order_id, menu_item_id) not in self._lines:
+                    continue
+                fired.add(menu_item_id)
+                batches.append(self._batch(menu_item_id, start_by))
+            return batches
+
+    def _batch(self, menu_item_id, start_by):
+        lines = sorted((self._lines[(order_id, menu_item_id)] for order_id in self._by_item[menu_item_id]),
+                       key=lambda line: line['start_by'])
+        taken = []
+        quantity = 0
+        for line in lines:
+            if line['start_by'] > start_by + self.batch_window:
+                break
+            if taken and quantity + line['quantity'] > self.batch_max:
+                break
+            taken.append(line)
+            quantity += line['quantity']
+        return {
+            'menu_item_id': menu_item_id,
+            'name': taken[0]['name'],
+            'prep_minutes': taken[0]['prep_minutes'],
+            'quantity': quantity,
+            'start_by': start_by.isoformat(timespec='seconds'),
+            'orders': [{'order_id': line['order_id'], 'quantity': line['quantity']} for line in taken],
+        }
+
+kitchen_queue = _service('kitchen_queue')
+
+def commit_orders(pending):
+    # All orders and their items go in one transaction: flush for the order
+    # ids, bulk insert the lines, commit once. Raises only if nothing was written.
+    orders = [
+        Order(
+            user_id=p['user_id'],
+            total_amount=p['total'],
+            delivery_address=p['address'],
+            customer_name=p['name'],
+            customer_phone=p['phone'],
+            status='pending'
+        )
+        for p in pending
+    ]
+    try:
+        db.session.add_all(orders)
+        db.session.flush()
+        order_ids = [order.id for order in orders]
+        created = [order.created_at for order in orders]
+        bump_order_stat('pending', len(orders), sum(p['total'] for p in pending))
+        rollups = {}
+        for order, p in zip(orders, pending):
+            add_order_to_rollups(rollups, order.created_at, [
+                (line['menu_item_id'], line['category_id'], line['quantity'], line['price'] * line['quantity'])
+                for line in p['lines']
+            ])
+        upsert_rollups(rollups)
+        db.session.execute(insert(OrderItem), [
+            {
+                'order_id': order_id,
+                'menu_item_id': line['menu_item_id'],
+                'quantity': line['quantity'],
+                'price': line['price']
+            }
+            for order_id, p in zip(order_ids, pending)
+            for line in p['lines']
+        ])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return order_ids, created
+
+def announce_orders(pending, order_ids, created):
+    for order_id, created_at, p in zip(order_ids, created, pending):
+        kitchen_queue.add_order(order_id, created_at, p['lines'])
+        order_events.publish('order_created', order_id, p['user_id'], 'pending', total=p['total'])
+
+def write_orders(pending):
+    order_ids, created = commit_orders(pending)
+    announce_orders(pending, order_ids, created)
+    return order_ids
+
+class OrderIntakeFull(Exception):
+    pass
+
+class OrderIntakeTimeout(Exception):
+    pass
+
+class OrderIntake:
+    """Group commit: a writer thread commits queued orders in batches."""
+
+    def __init__(self, app, max_batch, max_wait_ms, max_queue):
+        self.app = app
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, order, timeout):
+        self._ensure_writer()
+        future = Future()
+        try:
+            self._queue.put((order, future), timeout=timeout)
+        except queue.Full:
+            raise OrderIntakeFull()
+        return future
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='order-intake', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        # Orders whose caller gave up waiting are dropped, never written.
+        batch = [(order, future) for order, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        orders = [order for order, _ in batch]
+        with self.app.app_context():
+            try:
+                order_ids, created = commit_orders(orders)
+            except Exception:
+                # The batch was rolled back: retry one by one so a single bad
+                # order only fails itself.
+                written = []
+                for order, future in batch:
+                    try:
+                        ids, times = commit_orders([order])
+                    except Exception as exc:
+                        future.set_exception(exc)
+                    else:
+                        written.append((order, future, ids[0], times[0]))
+                batch = [(order, future) for order, future, _, _ in written]
+                orders = [order for order, _, _, _ in written]
+                order_ids = [order_id for _, _, order_id, _ in written]
+                created = [created_at for _, _, _, created_at in written]
+            # Committed: answer the callers before notifying anyone else.
+            for (_, future), order_id in zip(batch, order_ids):
+                future.set_result(order_id)
+            announce_orders(orders, order_ids, created)
+
+order_intake = _service('order_intake')
+
+def place_order(user_id, lines, total, name, phone, address):
+    order = {'user_id': user_id, 'lines': lines, 'total': total,
+             'name': name, 'phone': phone, 'address': address}
+    if current_app.config['ORDER_INTAKE'] == 'batched':
+        # Hand our pooled connection back before waiting, or a burst of
+        # waiting requests can starve the writer thread of connections.
+        db.session.close()
+        future = order_intake.submit(order, current_app.config['ORDER_INTAKE_SUBMIT_TIMEOUT'])
+        try:
+            return future.result(current_app.config['ORDER_INTAKE_RESULT_TIMEOUT'])
+        except FutureTimeoutError:
+            # Still queued: withdraw it, so the order is either placed or not.
+            if future.cancel():
+                raise OrderIntakeTimeout()
+            # The writer already has it; its commit decides the outcome.
+            return future.result()
+    return write_orders([order])[0]
+
+@bp.route('/checkout', methods=['GET', 'POST'])
 def checkout():
     if 'user_id' not in session:
         flash('Please login!', 'error')
         return redirect('/login')
     
     if request.method == 'POST':
-        cart = session.get('cart', {})
+        cart = get_cart()
         if not cart:
             flash('Cart is empty!', 'error')
             return redirect('/cart')
         
-        total = 0
-        for item_id, qty in cart.items():
-            item = MenuItem.query.get(int(item_id))
-            if item:
-                total += item.price * qty
-        
-        user = User.query.get(session['user_id'])
-        order = Order(
-            user_id=user.id,
-            total_amount=total,
-            delivery_address=request.form['address'],
-            customer_name=request.form['name'],
-            customer_phone=request.form['phone'],
-            status='pending'
-        )
-        db.session.add(order)
-        db.session.commit()
-        
-        for item_id, qty in cart.items():
-            item = MenuItem.query.get(int(item_id))
-            if item:
-                order_item = OrderItem(
-                    order_id=order.id,
-                    menu_item_id=item.id,
-                    quantity=qty,
-                    price=item.price
-                )
-                db.session.add(order_item)
+        # One catalogue lookup prices the cart for both the total and the lines.
+        lines, total = price_cart(cart)
+        if not lines:
+            clear_cart()
+            flash('Cart is empty!', 'error')
+            return redirect('/cart')
         
-        db.session.commit()
-        session.pop('cart', None)
-        flash(f'Order #{order.id} placed!', 'success')
+        try:
+            order_id = place_order(
+                user_id=session['user_id'],
+                lines=lines,
+                total=total,
+                name=request.form['name'],
+                phone=request.form['phone'],
+                address=request.form['address']
+            )
+        except (OrderIntakeFull, OrderIntakeTimeout):
+            flash('We are very busy right now, please try again in a moment.', 'error')
+            return redirect('/checkout')
+        clear_cart()
+        flash(f'Order #{order_id} placed!', 'success')
         return redirect('/orders')
     
     user = User.query.get(session['user_id'])
@@ -732,189 +2168,627 @@ def checkout():
     </form>
     '''
     
-    base_template = '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>%(title)s</title>
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { font-family: Arial, sans-serif; background: #f4f4f4; }
-            .header { background: #ff6b6b; color: white; padding: 1rem; text-align: center; }
-            .nav { background: #333; padding: 1rem; display: flex; gap: 1rem; flex-wrap: wrap; }
-            .nav a { color: white; text-decoration: none; padding: 0.5rem 1rem; border-radius: 4px; }
-            .nav a:hover { background: #555; }
-            .container { max-width: 1200px; margin: 0 auto; padding: 2rem; }
-            .form-group { margin-bottom: 1rem; }
-            .form-group label { display: block; margin-bottom: 0.3rem; font-weight: bold; }
-            .form-group input, .form-group textarea { width: 100%%; padding: 0.5rem; border: 1px solid #ddd; border-radius: 4px; }
-            .btn { background: #ff6b6b; color: white; padding: 0.5rem 1rem; border: none; border-radius: 4px; cursor: pointer; }
-            .alert { padding: 0.8rem; margin-bottom: 1rem; border-radius: 4px; }
-            .alert-success { background: #d4edda; color: #155724; }
-            .alert-error { background: #f8d7da; color: #721c24; }
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>🍕 Food Ordering System</h1>
-        </div>
-        <div class="nav">
-            <a href="/">Home</a>
-            <a href="/menu">Menu</a>
-            %(user_nav)s
-        </div>
-        <div class="container">
-            %(alerts)s
-            %(content)s
+    return render_page('Checkout', content)
+
+def encode_order_cursor(order):
+    return f"{order.created_at.isoformat()}_{order.id}"
+
+def decode_order_cursor(value):
+    try:
+        created_at, order_id = value.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (AttributeError, ValueError):
+        return None
+
+def get_page_size():
+    per_page = request.args.get('per_page', type=int) or current_app.config['ORDERS_PAGE_SIZE']
+    return max(1, min(per_page, current_app.config['ORDERS_PAGE_MAX']))
+
+def stream_order_cards(user_id, cursor, per_page, is_admin, pager):
+    # Keyset pagination on (created_at, id), newest first. Rows are pulled
+    # from the cursor in chunks and each card is sent as soon as it is
+    # rendered, so memory stays flat however large the page is. Items and
+    # their menu rows come in one extra query per chunk.
+    # The query is built here, not in the view: the stream runs in its own
+    # app context, and a query made earlier would use the view's session.
+    query = Order.query if user_id is None else Order.query.filter_by(user_id=user_id)
+    query = query.options(selectinload(Order.order_items).joinedload(OrderItem.menu_item))
+    if cursor:
+        query = query.filter(tuple_(Order.created_at, Order.id) < cursor)
+    rows = (query.order_by(Order.created_at.desc(), Order.id.desc())
+            .limit(per_page + 1).yield_per(current_app.config['ORDERS_STREAM_CHUNK']))
+    
+    shown = 0
+    next_cursor = None
+    for order in rows:
+        if shown == per_page:
+            next_cursor = encode_order_cursor(last_order)
+            continue
+        yield render_order_card(order, is_admin)
+        shown += 1
+        last_order = order
+    
+    if not shown:
+        yield "<p>No orders found.</p>"
+    yield f"<div>{pager(next_cursor)}</div>"
+
+def render_order_card(order, is_admin):
+    items_html = ""
+    for item in order.order_items:
+        items_html += f"<li>{item.menu_item.name} x {item.quantity} - ${item.price:.2f}</li>"
+    
+    status_control = ""
+    if is_admin:
+        status_control = f'''
+        <div class="form-group">
+            <label>Status:</label>
+            <select onchange="updateStatus({order.id}, this.value)">
+                <option value="pending" {"selected" if order.status=="pending" else ""}>Pending</option>
+                <option value="preparing" {"selected" if order.status=="preparing" else ""}>Preparing</option>
+                <option value="ready" {"selected" if order.status=="ready" else ""}>Ready</option>
+                <option value="delivered" {"selected" if order.status=="delivered" else ""}>Delivered</option>
+            </select>
         </div>
-    </body>
-    </html>
-    '''
+        '''
     
-    return render_template_string(base_template % {
-        'title': 'Checkout',
-        'user_nav': get_user_nav(),
-        'alerts': get_alerts(),
-        'content': content
-    })
+    return f'''
+    <div class="order-card" id="order-{order.id}">
+        <h3>Order #{order.id}</h3>
+        <p><strong>Status:</strong> <span class="order-status">{order.status.title()}</span></p>
+        <p><strong>Total:</strong> ${order.total_amount:.2f}</p>
+        <p><strong>Date:</strong> {order.created_at.strftime('%Y-%m-%d %H:%M')}</p>
+        <p><strong>Address:</strong> {order.delivery_address}</p>
+        <ul>{items_html}</ul>
+        {status_control}
+    </div>
+    '''
 
-@app.route('/orders')
+@bp.route('/orders')
 def orders():
     if 'user_id' not in session:
         flash('Please login!', 'error')
         return redirect('/login')
     
-    if session.get('is_admin'):
-        orders = Order.query.order_by(Order.created_at.desc()).all()
+    is_admin = session.get('is_admin')
+    if is_admin:
+        user_id = None
         title = "All Orders"
     else:
-        orders = Order.query.filter_by(user_id=session['user_id']).order_by(Order.created_at.desc()).all()
+        user_id = session['user_id']
         title = "My Orders"
     
-    orders_html = ""
-    for order in orders:
-        items_html = ""
-        for item in order.order_items:
-            items_html += f"<li>{item.menu_item.name} x {item.quantity} - ${item.price:.2f}</li>"
-        
-        status_control = ""
-        if session.get('is_admin'):
-            status_control = f'''
-            <div class="form-group">
-                <label>Status:</label>
-                <select onchange="updateStatus({order.id}, this.value)">
-                    <option value="pending" {"selected" if order.status=="pending" else ""}>Pending</option>
-                    <option value="preparing" {"selected" if order.status=="preparing" else ""}>Preparing</option>
-                    <option value="ready" {"selected" if order.status=="ready" else ""}>Ready</option>
-                    <option value="delivered" {"selected" if order.status=="delivered" else ""}>Delivered</option>
-                </select>
-            </div>
-            '''
-        
-        orders_html += f'''
-        <div class="order-card">
-            <h3>Order #{order.id}</h3>
-            <p><strong>Status:</strong> {order.status.title()}</p>
-            <p><strong>Total:</strong> ${order.total_amount:.2f}</p>
-            <p><strong>Date:</strong> {order.created_at.strftime('%Y-%m-%d %H:%M')}</p>
-            <p><strong>Address:</strong> {order.delivery_address}</p>
-            <ul>{items_html}</ul>
-            {status_control}
-        </div>
-        '''
-    
-    if not orders_html:
-        orders_html = "<p>No orders found.</p>"
-    
-    base_template = '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>%(title)s</title>
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { font-family: Arial, sans-serif; background: #f4f4f4; }
-            .header { background: #ff6b6b; color: white; padding: 1rem; text-align: center; }
-            .nav { background: #333; padding: 1rem; display: flex; gap: 1rem; flex-wrap: wrap; }
-            .nav a { color: white; text-decoration: none; padding: 0.5rem 1rem; border-radius: 4px; }
-            .nav a:hover { background: #555; }
-            .container { max-width: 1200px; margin: 0 auto; padding: 2rem; }
-            .order-card { background: white; padding: 1rem; border-radius: 6px; margin-bottom: 1rem; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }
-            .form-group { margin-bottom: 1rem; }
-            .form-group label { display: block; margin-bottom: 0.3rem; font-weight: bold; }
-            .form-group select { padding: 0.5rem; border: 1px solid #ddd; border-radius: 4px; }
-            .alert { padding: 0.8rem; margin-bottom: 1rem; border-radius: 4px; }
-            .alert-success { background: #d4edda; color: #155724; }
-            .alert-error { background: #f8d7da; color: #721c24; }
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>🍕 Food Ordering System</h1>
-        </div>
-        <div class="nav">
-            <a href="/">Home</a>
-            <a href="/menu">Menu</a>
-            %(user_nav)s
-        </div>
-        <div class="container">
-            %(alerts)s
-            %(content)s
-        </div>
-        <script>
-            %(scripts)s
-        </script>
-    </body>
-    </html>
-    '''
+    per_page = get_page_size()
+    cursor = decode_order_cursor(request.args.get('after'))
     
-    scripts = '''
-    function updateStatus(orderId, status) {
-        fetch('/update_order_status', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({order_id: orderId, status: status})
-        }).then(function(r) { return r.json(); }).then(function(data) {
-            if(data.success) location.reload();
-        });
-    }
-    '''
+    def pager(next_cursor):
+        links = '<a href="/orders" class="btn">Newest</a> ' if cursor else ''
+        if next_cursor:
+            links += f'<a href="/orders?{urlencode({"after": next_cursor, "per_page": per_page})}" class="btn">Older orders</a>'
+        return links
     
-    return render_template_string(base_template % {
-        'title': 'Orders',
-        'user_nav': get_user_nav(),
-        'alerts': get_alerts(),
-        'content': f"<h2>{title}</h2>{orders_html}",
-        'scripts': scripts
-    })
+    notice = '<div id="new-orders" class="alert-success" style="display: none;"></div>'
+    cards = stream_order_cards(user_id, cursor, per_page, is_admin, pager)
+    return render_page_stream('Orders', chain([f"<h2>{title}</h2>{notice}"], cards))
 
-@app.route('/update_order_status', methods=['POST'])
+@bp.route('/update_order_status', methods=['POST'])
 def update_order_status():
     if not session.get('is_admin'):
         return jsonify({'success': False, 'message': 'Unauthorized'})
     
     data = request.get_json()
+    if data['status'] not in ORDER_STATUSES:
+        return jsonify({'success': False, 'message': 'Unknown status'})
+    
     order = Order.query.get(data['order_id'])
     if order:
-        order.status = data['status']
+        old_status = order.status
+        changed = old_status != data['status']
+        order_id, user_id = order.id, order.user_id
+        if changed:
+            # Only move it from the status we read, so two admins changing the
+            # same order cannot both count it.
+            moved = db.session.execute(
+                update(Order).where(Order.id == order_id, Order.status == old_status)
+                .values(status=data['status']).execution_options(synchronize_session=False)
+            ).rowcount
+            if moved != 1:
+                db.session.rollback()
+                return jsonify({'success': False, 'message': 'The order was changed meanwhile, please reload.'})
+            bump_order_stat(old_status, -1, -order.total_amount)
+            bump_order_stat(data['status'], 1, order.total_amount)
         db.session.commit()
+        if changed:
+            kitchen_queue.status_changed(order_id, old_status, data['status'])
+            order_events.publish('status_changed', order_id, user_id, data['status'])
         return jsonify({'success': True})
     
     return jsonify({'success': False})
 
-@app.route('/admin')
+@bp.route('/orders/events')
+def order_event_stream():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Please login!'}), 401
+    
+    # The stream outlives the request context, so hold the hub itself rather
+    # than the proxy; unsubscribing in finally must still work after a disconnect.
+    hub = order_events._get_current_object()
+    subscriber = hub.subscribe(session['user_id'], bool(session.get('is_admin')))
+    keepalive = current_app.config['ORDER_EVENTS_KEEPALIVE']
+    
+    def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                events = subscriber.pop_all(keepalive)
+                if not events:
+                    yield ': keepalive\n\n'
+                for event_data in events:
+                    yield f"event: {event_data['type']}\ndata: {json.dumps(event_data)}\n\n"
+        finally:
+            hub.unsubscribe(subscriber)
+    
+    response = current_app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def start_kitchen_batch(menu_item_id, order_ids):
+    # Marks the dish started on those orders; orders still pending move to
+    # preparing. Returns how many order lines were started.
+    started = db.session.execute(
+        update(OrderItem)
+        .where(OrderItem.menu_item_id == menu_item_id, OrderItem.order_id.in_(order_ids),
+               OrderItem.started_at.is_(None))
+        .values(started_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    # Only the rows this statement moved count towards the stats, in case
+    # another request changed the same orders meanwhile.
+    fire = (update(Order).where(Order.id.in_(order_ids), Order.status == 'pending')
+            .values(status='preparing').execution_options(synchronize_session=False))
+    if db.engine.dialect.update_returning:
+        fired = db.session.execute(fire.returning(Order.id, Order.user_id, Order.total_amount)).all()
+    else:
+        fired = [row for row in db.session.execute(
+                     db.select(Order.id, Order.user_id, Order.total_amount)
+                     .where(Order.id.in_(order_ids), Order.status == 'pending')).all()
+                 if db.session.execute(fire.where(Order.id == row.id)).rowcount == 1]
+    if fired:
+        revenue = sum(row.total_amount for row in fired)
+        bump_order_stat('pending', -len(fired), -revenue)
+        bump_order_stat('preparing', len(fired), revenue)
+    db.session.commit()
+    kitchen_queue.start(menu_item_id, order_ids)
+    for row in fired:
+        order_events.publish('status_changed', row.id, row.user_id, 'preparing')
+    return started
+
+def get_kitchen_limit():
+    limit = request.args.get('limit', type=int) or current_app.config['KITCHEN_DISPLAY_LIMIT']
+    return max(1, min(limit, 100))
+
+@bp.route('/kitchen')
+def kitchen():
+    if not session.get('is_admin'):
+        flash('Access denied!', 'error')
+        return redirect('/')
+    
+    now = datetime.utcnow()
+    batches_html = ""
+    for batch in kitchen_queue.next_work(get_kitchen_limit()):
+        start_by = datetime.fromisoformat(batch['start_by'])
+        due = 'late' if start_by < now else f"in {int((start_by - now).total_seconds() // 60)} min"
+        orders = ', '.join(f"#{o['order_id']} x{o['quantity']}" for o in batch['orders'])
+        order_ids = [o['order_id'] for o in batch['orders']]
+        batches_html += f'''
+        <div class="order-card">
+            <h3>{batch['quantity']} x {escape(batch['name'])}</h3>
+            <p>Start by {start_by.strftime('%H:%M')} UTC ({due}), about {batch['prep_minutes']} min</p>
+            <p>Orders: {orders}</p>
+            <button class="btn" onclick="startBatch({batch['menu_item_id']}, {order_ids})">Start</button>
+        </div>
+        '''
+    
+    content = f'''
+    <h2>Kitchen - next to start</h2>
+    {batches_html or '<p>Nothing waiting to be started.</p>'}
+    '''
+    return render_page('Kitchen', content)
+
+@bp.route('/api/kitchen/next')
+def api_kitchen_next():
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    return jsonify({'batches': kitchen_queue.next_work(get_kitchen_limit())})
+
+@bp.route('/kitchen/start', methods=['POST'])
+def kitchen_start():
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    menu_item_id = data.get('menu_item_id')
+    order_ids = data.get('order_ids')
+    if (not _is_item_id(menu_item_id) or not isinstance(order_ids, list) or not order_ids
+            or not all(_is_item_id(order_id) for order_id in order_ids)):
+        return jsonify({'success': False, 'message': 'Send menu_item_id and a list of order_ids.'}), 400
+    return jsonify({'success': True, 'started': start_kitchen_batch(menu_item_id, order_ids)})
+
+EXPORT_COLUMNS = ['order_id', 'created_at', 'status', 'user_id', 'customer_name', 'customer_phone',
+                  'delivery_address', 'order_total', 'menu_item_id', 'menu_item_name', 'quantity', 'price']
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def parse_export_filters(start, end, status):
+    # start is inclusive and end exclusive, so month-long exports chain cleanly.
+    try:
+        start = datetime.fromisoformat(start) if start else None
+        end = datetime.fromisoformat(end) if end else None
+    except ValueError:
+        raise ValueError('Dates must be ISO formatted, e.g. 2024-01-31.')
+    if status and status not in ORDER_STATUSES:
+        raise ValueError(f"Unknown status: {status}")
+    return start, end, status or None
+
+def iter_order_export_rows(start, end, status):
+    # One row per order line, read from the cursor in chunks so memory stays
+    # flat however many months are exported.
+    query = (
+        db.select(Order.id, Order.created_at, Order.status, Order.user_id, Order.customer_name,
+                  Order.customer_phone, Order.delivery_address, Order.total_amount,
+                  OrderItem.menu_item_id, MenuItem.name, OrderItem.quantity, OrderItem.price)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .join(MenuItem, MenuItem.id == OrderItem.menu_item_id)
+        .order_by(Order.created_at, Order.id, OrderItem.id)
+        .execution_options(yield_per=current_app.config['ORDERS_EXPORT_CHUNK'])
+    )
+    if start:
+        query = query.where(Order.created_at >= start)
+    if end:
+        query = query.where(Order.created_at < end)
+    if status:
+        query = query.where(Order.status == status)
+    
+    for partition in db.session.execute(query).partitions():
+        yield partition
+
+def _export_values(row):
+    return (row[0], row[1].isoformat(), *row[2:])
+
+def export_orders(fmt, start, end, status):
+    # Yields text chunks, one per partition of rows.
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue()
+        for rows in iter_order_export_rows(start, end, status):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(_export_values(row) for row in rows)
+            yield buffer.getvalue()
+    else:
+        for rows in iter_order_export_rows(start, end, status):
+            yield ''.join(
+                json.dumps(dict(zip(EXPORT_COLUMNS, _export_values(row))), separators=(',', ':')) + '\n'
+                for row in rows
+            )
+
+@bp.route('/admin/orders/export')
+def export_orders_view():
+    if not session.get('is_admin'):
+        return 'Forbidden', 403
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': f"Unknown format: {fmt}"}), 400
+    try:
+        start, end, status = parse_export_filters(request.args.get('start'), request.args.get('end'),
+                                                  request.args.get('status'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    response = current_app.response_class(stream_with_context(export_orders(fmt, start, end, status)),
+                                  mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=orders.{fmt}'
+    return response
+
+@bp.cli.command('export-orders')
+@click.option('--format', 'fmt', type=click.Choice(sorted(EXPORT_FORMATS)), default='csv')
+@click.option('--start', help='First day to include (ISO date or datetime).')
+@click.option('--end', help='Stop before this day (ISO date or datetime).')
+@click.option('--status', help='Only orders with this status.')
+@click.option('--output', type=click.File('w'), default='-', help='File to write to (default: stdout).')
+def export_orders_command(fmt, start, end, status, output):
+    """Stream orders with their line items as CSV or NDJSON."""
+    try:
+        filters = parse_export_filters(start, end, status)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for chunk in export_orders(fmt, *filters):
+        output.write(chunk)
+
+class MenuImportError(Exception):
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} problem(s) in the menu import")
+        self.errors = errors
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'no', 'n'}
+
+def read_menu_import(raw, fmt):
+    # Returns (position, record) pairs. CSV has one row per item with a
+    # category column; JSON is either a list of such records or the
+    # {"categories": [{..., "items": [...]}]} shape served by /api/menu.
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(raw))
+        # Blank cells are treated as missing, so they leave the stored value alone.
+        return [(f"Line {reader.line_num}", {key.strip(): value.strip() for key, value in row.items()
+                                             if key and isinstance(value, str) and value.strip()})
+                for row in reader]
+    
+    try:
+        data = json.loads(raw)
+    except ValueError as e:
+        raise MenuImportError([f"Invalid JSON: {e}"])
+    if isinstance(data, dict) and isinstance(data.get('categories'), list):
+        records = []
+        for category in data['categories']:
+            if not isinstance(category, dict):
+                raise MenuImportError(['Each category must be an object.'])
+            records.append({'category': category.get('name'), 'category_description': category.get('description')})
+            records.extend({**item, 'category': category.get('name')} if isinstance(item, dict) else item
+                           for item in category.get('items', []))
+    elif isinstance(data, list):
+        records = data
+    else:
+        raise MenuImportError(['Expected a list of items or an object with a "categories" list.'])
+    return [(f"Record {n}", record) for n, record in enumerate(records, 1)]
+
+def _import_text(value):
+    return str(value).strip() if value is not None and str(value).strip() else None
+
+def validate_menu_import(records):
+    # Checks every record before anything is written; returns the category
+    # descriptions (None = leave as is) and the fields to set per item name.
+    errors = []
+    categories = {}
+    items = {}
+    for where, record in records:
+        if not isinstance(record, dict):
+            errors.append(f"{where}: expected an object.")
+            continue
+        category = _import_text(record.get('category'))
+        name = _import_text(record.get('name'))
+        if category:
+            description = _import_text(record.get('category_description'))
+            if description is not None or category not in categories:
+                categories[category] = description
+        if not name:
+            if not category:
+                errors.append(f"{where}: needs a name or a category.")
+            continue
+        if name in items:
+            errors.append(f"{where}: {name} appears more than once.")
+            continue
+        
+        fields = {'where': where}
+        if category:
+            fields['category'] = category
+        for key in ('description', 'image_url'):
+            if _import_text(record.get(key)) is not None:
+                fields[key] = _import_text(record.get(key))
+        if record.get('price') not in (None, ''):
+            try:
+                price = round(float(record['price']), 2)
+            except (TypeError, ValueError):
+                price = -1
+            if not 0 <= price < 1e6:
+                errors.append(f"{where}: price must be a number between 0 and 999999.")
+                continue
+            fields['price'] = price
+        if record.get('prep_minutes') not in (None, ''):
+            try:
+                prep_minutes = int(record['prep_minutes'])
+            except (TypeError, ValueError):
+                prep_minutes = -1
+            if not 0 <= prep_minutes <= 240:
+                errors.append(f"{where}: prep_minutes must be a whole number between 0 and 240.")
+                continue
+            fields['prep_minutes'] = prep_minutes
+        available = record.get('is_available')
+        if isinstance(available, bool):
+            fields['is_available'] = available
+        elif available not in (None, ''):
+            if str(available).lower() not in TRUE_VALUES | FALSE_VALUES:
+                errors.append(f"{where}: is_available must be true or false.")
+                continue
+            fields['is_available'] = str(available).lower() in TRUE_VALUES
+        items[name] = fields
+    return categories, items, errors
+
+def import_menu(records, dry_run=False):
+    # Upserts categories and menu items by name with a handful of bulk
+    # statements in one transaction. Bulk statements skip the mapper events,
+    # so the search index and menu caches are refreshed here explicitly.
+    categories, items, errors = validate_menu_import(records)
+    
+    existing_categories = {row.name: row for row in db.session.execute(
+        db.select(Category.id, Category.name, Category.description).order_by(Category.id.desc()))}
+    existing_items = {row.name: row for row in db.session.execute(
+        db.select(MenuItem.id, MenuItem.name, MenuItem.description, MenuItem.price, MenuItem.category_id,
+                  MenuItem.image_url, MenuItem.is_available, MenuItem.prep_minutes).order_by(MenuItem.id.desc()))}
+    for name, fields in items.items():
+        if name not in existing_items:
+            if 'category' not in fields or 'price' not in fields:
+                errors.append(f"{fields['where']}: new item {name} needs a category and a price.")
+    if errors:
+        raise MenuImportError(errors)
+    
+    new_categories = [{'name': name, 'description': description}
+                      for name, description in categories.items() if name not in existing_categories]
+    changed_categories = [{'id': existing_categories[name].id, 'description': description}
+                          for name, description in categories.items()
+                          if name in existing_categories and description is not None
+                          and description != existing_categories[name].description]
+    report = {'categories_created': len(new_categories), 'categories_updated': len(changed_categories),
+              'items_created': 0, 'items_updated': 0, 'items_unchanged': 0}
+    
+    category_ids = {name: row.id for name, row in existing_categories.items()}
+    if new_categories and not dry_run:
+        category_ids.update((row.name, row.id) for row in db.session.execute(
+            insert(Category).returning(Category.id, Category.name), new_categories))
+    if changed_categories and not dry_run:
+        db.session.execute(update(Category), changed_categories)
+    
+    new_items = []
+    changed_items = []
+    for name, fields in items.items():
+        values = {key: value for key, value in fields.items() if key not in ('where', 'category')}
+        if 'category' in fields:
+            values['category_id'] = category_ids.get(fields['category'])
+        row = existing_items.get(name)
+        if row is None:
+            new_items.append({'name': name, 'is_available': True, **values})
+        elif any(getattr(row, key) != value for key, value in values.items()):
+            changed_items.append({'id': row.id, **values})
+        else:
+            report['items_unchanged'] += 1
+    report['items_created'] = len(new_items)
+    report['items_updated'] = len(changed_items)
+    if dry_run:
+        return report
+    
+    touched_ids = [item['id'] for item in changed_items]
+    if new_items:
+        # Rows with different keys are grouped into separate INSERTs.
+        touched_ids += db.session.scalars(insert(MenuItem).returning(MenuItem.id), new_items).all()
+    if changed_items:
+        db.session.execute(update(MenuItem), changed_items)
+    if touched_ids:
+        reindex_menu_items(db.session.connection(), touched_ids)
+    if new_categories or changed_categories or touched_ids:
+        db.session.info['catalogue_changed'] = True
+    db.session.commit()
+    return report
+
+def detect_import_format(filename, mimetype):
+    if (filename or '').lower().endswith('.json') or mimetype == 'application/json':
+        return 'json'
+    return 'csv'
+
+@bp.route('/admin/menu/import', methods=['POST'])
+def import_menu_view():
+    if not session.get('is_admin'):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    # MAX_CONTENT_LENGTH caps the body while it is read, chunked uploads too.
+    try:
+        upload = request.files.get('file')
+        if upload:
+            raw = upload.read()
+            fmt = detect_import_format(upload.filename, upload.mimetype)
+        else:
+            # Read to the end: get_data() would stop quietly at the limit.
+            raw = b''.join(iter(partial(request.stream.read, 64 * 1024), b''))
+            fmt = detect_import_format(None, request.mimetype)
+    except RequestEntityTooLarge:
+        return jsonify({'success': False, 'message': 'Import file too large.'}), 413
+    try:
+        raw = raw.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return jsonify({'success': False, 'message': 'Import file must be UTF-8 text.'}), 400
+    fmt = request.args.get('format', fmt)
+    if fmt not in ('csv', 'json'):
+        return jsonify({'success': False, 'message': f"Unknown format: {fmt}"}), 400
+    
+    dry_run = request.args.get('dry_run', '').lower() in TRUE_VALUES
+    try:
+        report = import_menu(read_menu_import(raw, fmt), dry_run=dry_run)
+    except MenuImportError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e), 'errors': e.errors}), 400
+    return jsonify({'success': True, 'dry_run': dry_run, **report})
+
+@bp.cli.command('import-menu')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), help='Defaults to the file extension.')
+@click.option('--dry-run', is_flag=True, help='Validate and report without writing anything.')
+def import_menu_command(path, fmt, dry_run):
+    """Create or update categories and menu items from a CSV or JSON file."""
+    with open(path, encoding='utf-8-sig') as f:
+        raw = f.read()
+    try:
+        report = import_menu(read_menu_import(raw, fmt or detect_import_format(path, None)), dry_run=dry_run)
+    except MenuImportError as e:
+        raise click.ClickException('\n'.join([str(e)] + e.errors))
+    click.echo(', '.join(f"{key.replace('_', ' ')}: {value}" for key, value in report.items())
+               + (' (dry run)' if dry_run else ''))
+
+@bp.route('/metrics')
+def metrics():
+    if not session.get('is_admin'):
+        return 'Forbidden', 403
+    return current_app.response_class(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def render_ranking(title, rows):
+    html = f"<h3>{title}</h3>"
+    for row in rows:
+        html += f'<div class="cart-item"><span>{row.name}</span><span>{row.quantity} sold in {row.order_count} orders - ${row.revenue:.2f}</span></div>'
+    return html if rows else html + "<p>No sales yet.</p>"
+
+@bp.route('/admin/analytics')
+def analytics():
+    if not session.get('is_admin'):
+        flash('Access denied!', 'error')
+        return redirect('/')
+    
+    grain = request.args.get('grain', 'day')
+    if grain not in ROLLUP_GRAINS:
+        grain = 'day'
+    periods = request.args.get('periods', type=int) or (24 if grain == 'hour' else 30)
+    periods = max(1, min(periods, 24 * 14 if grain == 'hour' else 366))
+    report = get_sales_report(grain, periods)
+    
+    peak = max((row.revenue for _, row in report['timeline'] if row), default=0) or 1
+    label = '%Y-%m-%d %H:00' if grain == 'hour' else '%Y-%m-%d'
+    timeline_html = ""
+    for bucket, row in report['timeline']:
+        revenue = row.revenue if row else 0
+        orders = row.order_count if row else 0
+        timeline_html += f'''
+        <div class="cart-item">
+            <span style="width: 9rem;">{bucket.strftime(label)}</span>
+            <span style="flex: 1; margin: 0 1rem;"><span style="display: block; height: 0.8rem; background: #ff6b6b; width: {revenue / peak * 100:.1f}%;"></span></span>
+            <span>{orders} orders - ${revenue:.2f}</span>
+        </div>
+        '''
+    
+    other = 'hour' if grain == 'day' else 'day'
+    content = f'''
+    <h2>Sales by {grain} since {report['since'].strftime(label)} (UTC)</h2>
+    <p style="margin: 1rem 0;"><a href="/admin/analytics?grain={other}" class="btn">By {other}</a></p>
+    <div class="order-card">{timeline_html}</div>
+    <div class="stats" style="display: grid; grid-template-columns: repeat(2, 1fr); gap: 1rem;">
+        <div class="order-card">{render_ranking('Top items', report['top_items'])}</div>
+        <div class="order-card">{render_ranking('Top categories', report['top_categories'])}</div>
+    </div>
+    '''
+    return render_page('Sales analytics', content)
+
+@bp.route('/admin')
 def admin():
     if not session.get('is_admin'):
         flash('Access denied!', 'error')
         return redirect('/')
     
-    total_orders = Order.query.count()
-    pending_orders = Order.query.filter_by(status='pending').count()
-    total_revenue = db.session.query(db.func.sum(Order.total_amount)).scalar() or 0
+    stats = get_order_stats()
+    total_orders = stats['total_orders']
+    pending_orders = stats['by_status'].get('pending', 0)
+    total_revenue = stats['total_revenue']
     
     content = f'''
     <h2>Admin Dashboard</h2>
-    <div style="display: grid; grid-template-columns: repeat(3, 1fr); gap: 1rem; margin: 1rem 0;">
+    <div class="stats" style="display: grid; grid-template-columns: repeat(3, 1fr); gap: 1rem; margin: 1rem 0;">
         <div class="order-card">
             <h3>Total Orders</h3>
             <p style="font-size: 2rem;">{total_orders}</p>
@@ -928,51 +2802,73 @@ def admin():
             <p style="font-size: 2rem;">${total_revenue:.2f}</p>
         </div>
     </div>
+    <a href="/kitchen" class="btn">Kitchen</a>
+    <a href="/admin/analytics" class="btn">Sales by day</a>
+    <a href="/admin/analytics?grain=hour" class="btn">Sales by hour</a>
     '''
     
-    base_template = '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>%(title)s</title>
-        <style>
-            * { margin: 0; padding: 0; box-sizing: border-box; }
-            body { font-family: Arial, sans-serif; background: #f4f4f4; }
-            .header { background: #ff6b6b; color: white; padding: 1rem; text-align: center; }
-            .nav { background: #333; padding: 1rem; display: flex; gap: 1rem; flex-wrap: wrap; }
-            .nav a { color: white; text-decoration: none; padding: 0.5rem 1rem; border-radius: 4px; }
-            .nav a:hover { background: #555; }
-            .container { max-width: 1200px; margin: 0 auto; padding: 2rem; }
-            .order-card { background: white; padding: 1rem; border-radius: 6px; margin-bottom: 1rem; box-shadow: 0 1px 3px rgba(0,0,0,0.1); text-align: center; }
-            .alert { padding: 0.8rem; margin-bottom: 1rem; border-radius: 4px; }
-            .alert-success { background: #d4edda; color: #155724; }
-            .alert-error { background: #f8d7da; color: #721c24; }
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>🍕 Food Ordering System</h1>
-        </div>
-        <div class="nav">
-            <a href="/">Home</a>
-            <a href="/menu">Menu</a>
-            %(user_nav)s
-        </div>
-        <div class="container">
-            %(alerts)s
-            %(content)s
-        </div>
-    </body>
-    </html>
-    '''
+    return render_page('Admin', content)
+
+def create_app(config=None):
+    """Build an app from the environment, with ``config`` applied on top.
+    
+    Nothing here touches the database; run ``flask migrate`` and ``flask seed``
+    to set up a new one. The shared state is only opened here when SECRET_KEY
+    is unset and the key has to be read from it.
+    """
+    app = Flask(__name__)
+    app.config.from_mapping(load_config())
+    if config:
+        app.config.from_mapping(config)
+    state = make_shared_state(app)
+    if not app.config['SECRET_KEY']:
+        if state.shared:
+            # Every worker on the host signs sessions with the same stored key.
+            app.config['SECRET_KEY'] = state.setdefault('secret_key', secrets.token_hex(32))
+            app.logger.warning('SECRET_KEY is not set; using the key kept in the shared state.')
+        else:
+            # Sessions signed with a throwaway key die with the process.
+            app.config['SECRET_KEY'] = secrets.token_hex(32)
+            app.logger.warning('SECRET_KEY is not set; using a random key for this process.')
+    
+    db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'connect', partial(_tune_sqlite_connection, app.config))
+    app.register_blueprint(bp)
     
-    return render_template_string(base_template % {
-        'title': 'Admin',
-        'user_nav': get_user_nav(),
-        'alerts': get_alerts(),
-        'content': content
+    app.extensions.update({
+        'shared_state': state,
+        'menu_cache': MenuCache(state, app.config['MENU_CACHE_SIZE']),
+        'cart_store': make_cart_store(app, state),
+        'order_events': OrderEventHub(state, app.config['ORDER_EVENTS_BUFFER'],
+                                      app.config['ORDER_EVENTS_POLL_MS'] / 1000),
+        'kitchen_queue': KitchenQueue(
+            state,
+            app.config['KITCHEN_TARGET_MINUTES'],
+            app.config['KITCHEN_BATCH_WINDOW_MINUTES'],
+            app.config['KITCHEN_BATCH_MAX']
+        ),
+        'password_hasher': PasswordHasher(
+            app.config['PASSWORD_HASH_METHOD'],
+            app.config['PASSWORD_HASH_WORKERS'],
+            app.config['PASSWORD_HASH_MAX_PENDING'],
+            app.config['PASSWORD_HASH_WAIT']
+        ),
+        'order_intake': OrderIntake(
+            app,
+            app.config['ORDER_INTAKE_BATCH'],
+            app.config['ORDER_INTAKE_WAIT_MS'],
+            app.config['ORDER_INTAKE_QUEUE']
+        ),
+        'request_metrics': make_request_metrics(),
+        'static_assets': StaticAssets(app.static_folder),
+        'page_layout': app.jinja_env.from_string(PAGE_TEMPLATE),
     })
+    return app
 
 if __name__ == '__main__':
-    init_db()
+    app = create_app()
+    init_db(app)
+    app.extensions['password_hasher'].start()
     app.run(debug=True)
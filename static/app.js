@@ -0,0 +1,86 @@
+setTimeout(function() {
+    var alerts = document.querySelectorAll('.alert');
+    alerts.forEach(function(alert) {
+        alert.style.display = 'none';
+    });
+}, 4000);
+
+// Cart clicks made within a moment of each other go to /api/cart as one
+// batch, and the reply updates the cart link and cart in place.
+var pendingCartOps = [];
+var cartFlushTimer = null;
+
+function queueCartOp(op) {
+    pendingCartOps.push(op);
+    clearTimeout(cartFlushTimer);
+    cartFlushTimer = setTimeout(sendCartOps, 150);
+}
+
+function sendCartOps() {
+    var ops = pendingCartOps;
+    pendingCartOps = [];
+    fetch('/api/cart', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({ops: ops})
+    }).then(function(r) { return r.json(); }).then(function(data) {
+        if(!data.success) {
+            alert(data.message);
+            return;
+        }
+        var link = document.getElementById('cart-link');
+        if (link) link.textContent = 'Cart (' + data.count + ')';
+        var cart = document.getElementById('cart');
+        if (cart) cart.innerHTML = data.html;
+    });
+}
+
+function addToCart(itemId) {
+    queueCartOp({op: 'add', item_id: itemId, quantity: 1});
+}
+
+function changeCart(itemId, delta) {
+    queueCartOp({op: 'add', item_id: itemId, quantity: delta});
+}
+
+function updateStatus(orderId, status) {
+    fetch('/update_order_status', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({order_id: orderId, status: status})
+    }).then(function(r) { return r.json(); }).then(function(data) {
+        if(!data.success) alert(data.message || 'Could not update the order.');
+    });
+}
+
+function startBatch(menuItemId, orderIds) {
+    fetch('/kitchen/start', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({menu_item_id: menuItemId, order_ids: orderIds})
+    }).then(function(r) { return r.json(); }).then(function(data) {
+        if(data.success) location.reload();
+        else alert(data.message || 'Could not start the batch.');
+    });
+}
+
+// Live order updates pushed from /orders/events; only the orders page
+// carries the #new-orders notice, so other pages never open the stream.
+document.addEventListener('DOMContentLoaded', function() {
+    var notice = document.getElementById('new-orders');
+    if (!notice || !window.EventSource) return;
+    var orderEvents = new EventSource('/orders/events');
+    orderEvents.addEventListener('status_changed', function(e) {
+        var data = JSON.parse(e.data);
+        var card = document.getElementById('order-' + data.order_id);
+        if (!card) return;
+        card.querySelector('.order-status').textContent = data.status.charAt(0).toUpperCase() + data.status.slice(1);
+        var select = card.querySelector('select');
+        if (select) select.value = data.status;
+    });
+    orderEvents.addEventListener('order_created', function(e) {
+        var data = JSON.parse(e.data);
+        notice.innerHTML = '<a href="/orders">New order #' + data.order_id + ' - show latest</a>';
+        notice.style.display = 'block';
+    });
+});
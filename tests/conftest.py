@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import event
+
+from food_ordering import create_app, db, init_db, User
+
+
+@pytest.fixture
+def app(tmp_path):
+    # A seeded SQLite database of its own and in-process state, whatever the
+    # environment says.
+    app = create_app({
+        'SECRET_KEY': 'test',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'SQLALCHEMY_ENGINE_OPTIONS': {},
+        'SHARED_STATE': 'memory',
+        'CART_STORE': 'memory',
+        'ORDER_INTAKE': 'direct',
+        'PASSWORD_HASH_WORKERS': 0,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+    })
+    init_db(app)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def customer_id(app):
+    with app.app_context():
+        user = User(username='customer', email='customer@example.com', password='unused')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def customer(app, customer_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = customer_id
+    return client
+
+
+class QueryLog:
+    def __init__(self):
+        self.statements = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    def clear(self):
+        self.statements.clear()
+
+    def reads(self, table):
+        return sum(1 for statement, _ in self.statements
+                   if statement.lstrip().upper().startswith('SELECT') and f'FROM {table}' in statement)
+
+
+@pytest.fixture
+def queries(app):
+    """Records every statement sent to the database while the test runs."""
+    log = QueryLog()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        log.statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield log
+    event.remove(engine, 'before_cursor_execute', record)
@@ -0,0 +1,44 @@
+import pytest
+
+from food_ordering import db, cart_key, Category, MenuItem
+
+CHECKOUT_FORM = {'name': 'Test', 'phone': '1', 'address': 'Test St'}
+
+
+@pytest.fixture
+def item_ids(app):
+    # The seeded menu has a handful of dishes; top it up to 25.
+    with app.app_context():
+        category = Category.query.first()
+        have = MenuItem.query.count()
+        db.session.add_all(MenuItem(name=f'Dish {n}', price=5 + n, category_id=category.id)
+                           for n in range(have, 25))
+        db.session.commit()
+        return [item.id for item in MenuItem.query.filter_by(is_available=True).limit(25)]
+
+
+def fill_cart(app, customer_id, item_ids):
+    app.extensions['cart_store'].save(cart_key(customer_id), {str(item_id): 2 for item_id in item_ids})
+
+
+def test_cart_page_reads_the_catalogue_once(app, customer, customer_id, item_ids, queries):
+    fill_cart(app, customer_id, item_ids)
+    queries.clear()
+    response = customer.get('/cart')
+    assert response.status_code == 200
+    assert b'Dish 24' in response.data
+    assert queries.reads('menu_item') == 1
+    assert len(queries) == 1
+
+
+def test_checkout_query_count_does_not_grow_with_cart_lines(app, customer, customer_id, item_ids, queries):
+    def checkout(lines):
+        fill_cart(app, customer_id, item_ids[:lines])
+        queries.clear()
+        response = customer.post('/checkout', data=CHECKOUT_FORM)
+        assert response.status_code == 302 and response.location.endswith('/orders')
+        assert queries.reads('menu_item') == 1
+        return len(queries)
+
+    checkout(1)  # the first order also creates the pending stats row
+    assert checkout(1) == checkout(25)
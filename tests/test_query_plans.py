@@ -0,0 +1,60 @@
+from urllib.parse import urlencode
+
+from food_ordering import db, encode_order_cursor, menu_cache, MenuItem, Order, User
+
+# Small lookup tables that are meant to be read whole.
+SCAN_ALLOWED_TABLES = {'category', 'order_stat', 'schema_migration'}
+
+
+def visit_pages(app, customer, queries):
+    with app.app_context():
+        admin_id = User.query.filter_by(is_admin=True).one().id
+        item_ids = [item.id for item in MenuItem.query.limit(3)]
+    customer.post('/api/cart', json={'ops': [{'op': 'add', 'item_id': item_id} for item_id in item_ids]})
+    customer.post('/checkout', data={'name': 'Test', 'phone': '1', 'address': 'Test St'})
+    with app.app_context():
+        newest = Order.query.order_by(Order.created_at.desc(), Order.id.desc()).first()
+        after = encode_order_cursor(newest)
+        menu_cache.invalidate()
+    queries.clear()
+
+    client = app.test_client()
+    for path in ('/', '/menu', '/menu?category_id=1', '/menu/search?q=pizza', '/api/menu/search?q=che'):
+        client.get(path, buffered=True)
+    client.post('/login', data={'username': 'nobody', 'password': 'x'})
+
+    customer.post('/api/cart', json={'ops': [{'op': 'add', 'item_id': item_id} for item_id in item_ids]})
+    for path in ('/cart', '/checkout', '/orders'):
+        customer.get(path, buffered=True)
+
+    with client.session_transaction() as sess:
+        sess['user_id'] = admin_id
+        sess['is_admin'] = True
+    for path in ('/orders', f'/orders?{urlencode({"after": after})}', '/admin', '/kitchen',
+                 '/admin/analytics', '/admin/analytics?grain=hour'):
+        client.get(path, buffered=True)
+
+
+def full_scans(app, statements):
+    problems = []
+    with app.app_context():
+        connection = db.session.connection()
+        for statement, parameters in statements:
+            plan = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            for row in plan:
+                detail = row[-1]
+                # FTS5 lookups show as a scan of the virtual table's own index.
+                if detail.startswith('SCAN ') and 'USING' not in detail and 'VIRTUAL TABLE INDEX' not in detail:
+                    table = detail.split()[1]
+                    # Subquery results (anon_1, ...) are already cut down; only real tables count.
+                    if table in db.metadata.tables and table not in SCAN_ALLOWED_TABLES:
+                        problems.append(f"{detail}: {' '.join(statement.split())}")
+    return problems
+
+
+def test_page_queries_use_indexes(app, customer, queries):
+    visit_pages(app, customer, queries)
+    selects = [(statement, parameters) for statement, parameters in queries.statements
+               if statement.lstrip().upper().startswith('SELECT')]
+    assert len(selects) > 20
+    assert full_scans(app, selects) == []
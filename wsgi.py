@@ -0,0 +1,15 @@
+"""WSGI entry point for running several worker processes, e.g.:
+
+    SECRET_KEY=... SHARED_STATE=sqlite gunicorn --workers 4 wsgi:app
+
+Set up the database once beforehand with `flask --app food_ordering migrate`
+and `flask --app food_ordering seed`.
+
+Each worker imports this module and forks its password hashing processes
+here, before the server starts any request threads. Don't use --preload,
+which would fork them once in the master instead.
+"""
+from food_ordering import create_app
+
+app = create_app()
+app.extensions['password_hasher'].start()